@@ -0,0 +1,157 @@
+import json
+
+from primitive_db.columnar import decode_value
+from primitive_db.indexes import lookup_condition
+
+# Состояние группы - список: число строк группы, затем текущее значение каждой
+# агрегатной функции с аргументом (сумма, минимум или максимум). count(*) и
+# count(<колонка>) равны числу строк: пустых значений в таблицах нет.
+
+
+def item_name(item):
+    """
+    Get the name of a select item in the result rows, like "sum(age)".
+    """
+    if isinstance(item, tuple):
+        return f"{item[0]}({item[1]})"
+    return item
+
+
+def value_aggregates(items):
+    """
+    Get the aggregates of the select items that need the values of a column.
+    """
+    return [item for item in items
+            if isinstance(item, tuple) and item[0] != "count"]
+
+
+def fold_groups(value_rows, group_size, functions):
+    """
+    Fold rows into one state per group in a single pass.
+
+    Args:
+        value_rows (iterable): Tuples of the grouping values followed by
+            the argument of every function.
+        group_size (int): Number of grouping values.
+        functions (list): "sum", "avg", "min" or "max" for every argument.
+
+    Returns:
+        dict: {grouping values: state} in the order groups were met.
+    """
+    groups = {}
+    for values in value_rows:
+        key = values[:group_size]
+        state = groups.get(key)
+        if state is None:
+            groups[key] = [1, *values[group_size:]]
+            continue
+        state[0] += 1
+        for i, function in enumerate(functions, 1):
+            value = values[group_size + i - 1]
+            if function == "min":
+                if value < state[i]:
+                    state[i] = value
+            elif function == "max":
+                if value > state[i]:
+                    state[i] = value
+            else:
+                state[i] += value
+    return groups
+
+
+def index_aggregate(table_data, items, where_clause, group_by, indexes):
+    """
+    Answer an aggregate query without reading the rows, if possible.
+
+    count(*) without conditions is the row count of the table, with a single
+    indexed condition it is the number of IDs the index finds. min and max
+    come from the ends of an ordered index or of the ID column, counts by
+    groups of one column from its hash index.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        items (tuple): Column names and (function, column) pairs.
+        where_clause (list): Conditions in the form (column, operator, value).
+        group_by (tuple): Grouping columns.
+        indexes (dict): Indexes of the table {column: index}.
+
+    Returns:
+        dict: Group states like fold_groups returns, or None if the rows
+            have to be scanned.
+    """
+    indexes = indexes or {}
+    aggregates = value_aggregates(items)
+    if where_clause:
+        if aggregates or group_by or len(where_clause) != 1:
+            return None
+        column, operator_name, value = where_clause[0]
+        if column not in indexes:
+            return None
+        ids = lookup_condition(indexes[column], operator_name, value)
+        if ids is None:
+            return None
+        return {(): [len(ids)]} if ids else {}
+
+    if group_by:
+        index = indexes.get(group_by[0])
+        if (aggregates or len(group_by) != 1 or index is None
+                or index["type"] != "hash"):
+            return None
+        return {(json.loads(key),): [len(ids)]
+                for key, ids in index["entries"].items() if ids}
+
+    if not len(table_data):
+        return {}
+    state = [len(table_data)]
+    for function, column in aggregates:
+        if function not in ("min", "max"):
+            return None
+        end = 0 if function == "min" else -1
+        if column == "ID":
+            state.append(table_data[end]["ID"])
+        elif column in indexes and indexes[column]["type"] == "ordered":
+            state.append(indexes[column]["entries"][end][0])
+        else:
+            return None
+    return {(): state}
+
+
+def group_rows(groups, items, group_by, column_types):
+    """
+    Build the result rows from the group states.
+
+    Without group by the query returns a single row even if no rows matched.
+
+    Args:
+        groups (dict): {grouping values: state}.
+        items (tuple): Column names and (function, column) pairs.
+        group_by (tuple): Grouping columns.
+        column_types (dict): Types of the table columns {column: type}.
+
+    Returns:
+        list: Result rows as dicts.
+    """
+    aggregates = value_aggregates(items)
+    if not groups and not group_by:
+        groups = {(): [0] + [None] * len(aggregates)}
+    state_positions = {item: i for i, item in enumerate(aggregates, 1)}
+    key_positions = {column: i for i, column in enumerate(group_by)}
+
+    rows = []
+    for key, state in groups.items():
+        row = {}
+        for item in items:
+            if not isinstance(item, tuple):
+                value = decode_value(column_types[item], key[key_positions[item]])
+            elif item[0] == "count":
+                value = state[0]
+            else:
+                function, column = item
+                value = state[state_positions[item]]
+                if function == "avg":
+                    value = value / state[0] if state[0] else None
+                elif function in ("min", "max") and value is not None:
+                    value = decode_value(column_types[column], value)
+            row[item_name(item)] = value
+        rows.append(row)
+    return rows
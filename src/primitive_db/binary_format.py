@@ -0,0 +1,278 @@
+import mmap
+import os
+import struct
+from array import array
+from itertools import accumulate
+
+from primitive_db.columnar import ColumnarTable, encode_value, new_vector
+from primitive_db.wal import sync_file
+
+MAGIC = b"PDBC"
+FORMAT_VERSION = 1
+TYPE_CODES = {"int": 1, "bool": 2, "str": 3}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+HEADER = struct.Struct("<4sHI")
+COLUMN_HEADER = struct.Struct("<BH")
+ROW_COUNT = struct.Struct("<Q")
+
+# Файл таблицы:
+#   заголовок: MAGIC, версия, число колонок, (тип, длина имени, имя) на колонку,
+#   число строк, смещения блоков колонок (u64 на колонку);
+#   блоки колонок: int - n * i64, bool - n * u8,
+#   str - (n + 1) * u64 смещений в байтах и склеенные строки UTF-8.
+
+
+def table_vectors(columns, data):
+    """
+    Get the column vectors of table data.
+
+    Args:
+        columns (list): Column definitions like ["ID:int", "name:str"].
+        data (list or ColumnarTable): Rows of the table.
+
+    Returns:
+        list: One vector per column, in the order of columns.
+    """
+    if isinstance(data, ColumnarTable):
+        return [data.vectors[column.split(":", 1)[0]] for column in columns]
+
+    vectors = []
+    for column in columns:
+        name, column_type = column.split(":", 1)
+        vectors.append(new_vector(
+            column_type,
+            [encode_value(column_type, row.get(name)) for row in data],
+        ))
+    return vectors
+
+
+def encode_column(column_type, vector):
+    """
+    Encode a column vector to the bytes of its block.
+    """
+    if column_type == "int":
+        return array("q", vector).tobytes()
+    if column_type == "bool":
+        return bytes(vector)
+
+    encoded = [value.encode("utf-8") for value in vector]
+    offsets = array("Q", [0])
+    offsets.extend(accumulate(len(value) for value in encoded))
+    return offsets.tobytes() + b"".join(encoded)
+
+
+def encode_table(columns, data):
+    """
+    Encode table data to the binary table format.
+
+    Args:
+        columns (list): Column definitions like ["ID:int", "name:str"].
+        data (list or ColumnarTable): Rows of the table.
+
+    Returns:
+        bytes: Contents of the table file.
+    """
+    header = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, len(columns)))
+    for column in columns:
+        name, column_type = column.split(":", 1)
+        encoded_name = name.encode("utf-8")
+        header += COLUMN_HEADER.pack(TYPE_CODES[column_type], len(encoded_name))
+        header += encoded_name
+    header += ROW_COUNT.pack(len(data))
+
+    blocks = [
+        encode_column(column.split(":", 1)[1], vector)
+        for column, vector in zip(columns, table_vectors(columns, data))
+    ]
+    offset = len(header) + 8 * len(columns)
+    block_offsets = []
+    for block in blocks:
+        block_offsets.append(offset)
+        offset += len(block)
+
+    return bytes(header) + array("Q", block_offsets).tobytes() + b"".join(blocks)
+
+
+def decode_header(buffer):
+    """
+    Decode the header of a binary table.
+
+    Args:
+        buffer (bytes, memoryview or mmap): Contents of the table file.
+
+    Returns:
+        tuple: (columns, row count, offsets of the column blocks).
+    """
+    magic, version, column_count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("неизвестный формат файла таблицы")
+
+    position = HEADER.size
+    columns = []
+    for _ in range(column_count):
+        type_code, name_length = COLUMN_HEADER.unpack_from(buffer, position)
+        position += COLUMN_HEADER.size
+        name = bytes(buffer[position:position + name_length]).decode("utf-8")
+        position += name_length
+        columns.append(f"{name}:{TYPE_NAMES[type_code]}")
+
+    (row_count,) = ROW_COUNT.unpack_from(buffer, position)
+    position += ROW_COUNT.size
+    block_offsets = array("Q")
+    block_offsets.frombytes(bytes(buffer[position:position + 8 * column_count]))
+    return columns, row_count, list(block_offsets)
+
+
+def decode_column(buffer, column_type, offset, row_count):
+    """
+    Decode a whole column block to a column vector.
+    """
+    if column_type == "int":
+        vector = array("q")
+        vector.frombytes(bytes(buffer[offset:offset + 8 * row_count]))
+        return vector
+    if column_type == "bool":
+        return bytearray(buffer[offset:offset + row_count])
+
+    offsets = array("Q")
+    offsets.frombytes(bytes(buffer[offset:offset + 8 * (row_count + 1)]))
+    start = offset + 8 * (row_count + 1)
+    blob = bytes(buffer[start:start + offsets[-1]])
+    return [
+        blob[begin:end].decode("utf-8")
+        for begin, end in zip(offsets, offsets[1:])
+    ]
+
+
+def decode_table(buffer, names=None):
+    """
+    Decode a binary table.
+
+    Args:
+        buffer (bytes): Contents of the table file.
+        names (list, optional): Names of the columns to decode. By default
+            all columns are decoded; the blocks of other columns are skipped.
+
+    Returns:
+        ColumnarTable: The decoded table.
+    """
+    columns, row_count, block_offsets = decode_header(buffer)
+    blocks = [
+        (column, offset) for column, offset in zip(columns, block_offsets)
+        if names is None or column.split(":", 1)[0] in names
+    ]
+    vectors = [
+        decode_column(buffer, column.split(":", 1)[1], offset, row_count)
+        for column, offset in blocks
+    ]
+    return ColumnarTable.from_vectors([column for column, _ in blocks], vectors)
+
+
+def read_binary_table(file_path, names=None):
+    """
+    Read a table file in the binary format, or only some of its columns.
+    """
+    with open(file_path, "rb") as file:
+        table = decode_table(file.read(), names)
+    table.source_path = file_path
+    return table
+
+
+def read_binary_columns(file_path):
+    """
+    Read only the column definitions from a binary table file.
+    """
+    with open(file_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return decode_header(buffer)[0]
+
+
+class MappedStrColumn:
+    """
+    Read-only view of a str column block in a memory-mapped table file.
+
+    A value is decoded only when it is accessed.
+    """
+
+    def __init__(self, buffer, offset, row_count):
+        end = offset + 8 * (row_count + 1)
+        self.buffer = buffer
+        self.offsets = memoryview(buffer)[offset:end].cast("Q")
+        self.blob_start = end
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("column index out of range")
+        begin = self.blob_start + self.offsets[position]
+        end = self.blob_start + self.offsets[position + 1]
+        return self.buffer[begin:end].decode("utf-8")
+
+    def __iter__(self):
+        buffer, start = self.buffer, self.blob_start
+        for begin, end in zip(self.offsets, self.offsets[1:]):
+            yield buffer[start + begin:start + end].decode("utf-8")
+
+
+def map_column(buffer, column_type, offset, row_count):
+    """
+    Get a read-only view of a column block without decoding it.
+    """
+    view = memoryview(buffer)
+    if column_type == "int":
+        return view[offset:offset + 8 * row_count].cast("q")
+    if column_type == "bool":
+        return view[offset:offset + row_count]
+    return MappedStrColumn(buffer, offset, row_count)
+
+
+def map_binary_table(file_path):
+    """
+    Memory-map a binary table file for reading.
+
+    Nothing but the header is read up front: the ID column is searched in
+    place, and filters and rows read only the values they touch. The
+    returned table must not be modified.
+
+    Args:
+        file_path (str): Path of the table file.
+
+    Returns:
+        ColumnarTable: Table backed by the mapped file.
+    """
+    with open(file_path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    columns, row_count, block_offsets = decode_header(buffer)
+    vectors = [
+        map_column(buffer, column.split(":", 1)[1], offset, row_count)
+        for column, offset in zip(columns, block_offsets)
+    ]
+    table = ColumnarTable.from_vectors(columns, vectors)
+    table.source_path = file_path
+    return table
+
+
+def write_binary_table(file_path, columns, data):
+    """
+    Write table data to a file in the binary format.
+
+    Args:
+        file_path (str): Path of the table file.
+        columns (list): Column definitions like ["ID:int", "name:str"].
+        data (list or ColumnarTable): Rows of the table.
+
+    Returns:
+        None.
+    """
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(encode_table(columns, data))
+        sync_file(file)
+    os.replace(tmp_path, file_path)
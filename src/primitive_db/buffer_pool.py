@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+
+from primitive_db.constants import BUFFER_POOL_MAX_BYTES
+
+buffer_pool = OrderedDict()
+dirty_pool = {}
+# Защищает структуры пула, таблицы защищены своими блокировками (locks.py)
+storage_lock = threading.RLock()
+pool_stats = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def get_files_signature(*file_paths):
+    """
+    Get a cheap signature of files to detect changes made since they were read.
+
+    Args:
+        file_paths (str): Paths of the files.
+
+    Returns:
+        tuple: (mtime_ns, size) for every file, None for missing files.
+    """
+    signature = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def signature_size(signature):
+    """
+    Estimate the memory taken by decoded data from the size of its files.
+    """
+    return sum(part[1] for part in signature if part is not None)
+
+
+def get_pooled(key, signature):
+    """
+    Get decoded data from the buffer pool if its files haven't changed.
+
+    Dirty data is newer than its files and is always returned.
+
+    Args:
+        key (str): Key of the data, e.g. the table name.
+        signature (tuple): Current signature of the files of the data.
+
+    Returns:
+        Decoded data or None if it is missing or outdated.
+    """
+    with storage_lock:
+        if key in dirty_pool:
+            pool_stats["hits"] += 1
+            return dirty_pool[key]
+
+        entry = buffer_pool.get(key)
+        if entry is None or entry[0] != signature:
+            pool_stats["misses"] += 1
+            return None
+
+        buffer_pool.move_to_end(key)
+        pool_stats["hits"] += 1
+        return entry[1]
+
+
+def evict_pooled(key):
+    """
+    Remove data from the buffer pool, including unsaved changes.
+    """
+    with storage_lock:
+        dirty_pool.pop(key, None)
+        entry = buffer_pool.pop(key, None)
+        if entry is not None:
+            pool_stats["bytes"] -= signature_size(entry[0])
+
+
+def put_pooled(key, signature, data, max_bytes=BUFFER_POOL_MAX_BYTES):
+    """
+    Keep decoded data in the buffer pool.
+
+    Least recently used data is evicted while the pool is over max_bytes.
+    Dirty data is never evicted, it is stored in dirty_pool until saved.
+
+    Args:
+        key (str): Key of the data, e.g. the table name.
+        signature (tuple): Signature of the files the data was read from.
+        data: Decoded data.
+        max_bytes (int): Memory budget of the pool.
+
+    Returns:
+        None.
+    """
+    with storage_lock:
+        evict_pooled(key)
+        size = signature_size(signature)
+        if size > max_bytes:
+            return
+
+        buffer_pool[key] = (signature, data)
+        pool_stats["bytes"] += size
+        while pool_stats["bytes"] > max_bytes:
+            _, (evicted_signature, _) = buffer_pool.popitem(last=False)
+            pool_stats["bytes"] -= signature_size(evicted_signature)
+            pool_stats["evictions"] += 1
+
+
+def put_dirty(key, data):
+    """
+    Keep data that differs from its files until it is saved.
+
+    Args:
+        key (str): Key of the data, e.g. the table name.
+        data: Decoded data with unsaved changes.
+
+    Returns:
+        None.
+    """
+    with storage_lock:
+        evict_pooled(key)
+        dirty_pool[key] = data
+
+
+def is_dirty(key):
+    """
+    Check whether the data has unsaved changes.
+    """
+    return key in dirty_pool
@@ -0,0 +1,72 @@
+import socket
+import struct
+
+from primitive_db.constants import SERVER_HOST, SERVER_PORT
+
+# Протокол сервера: клиент отправляет команду одной строкой в UTF-8,
+# сервер отвечает длиной ответа (u32, big-endian) и текстом ответа в UTF-8.
+# После команды exit сервер закрывает соединение.
+RESPONSE_HEADER = struct.Struct(">I")
+
+
+def encode_response(text):
+    """
+    Encode the output of a command as a length-prefixed response.
+    """
+    payload = text.encode("utf-8")
+    return RESPONSE_HEADER.pack(len(payload)) + payload
+
+
+class Client:
+    """
+    Connection to a database server started with "database serve".
+
+    Example:
+        with Client(port=7433) as client:
+            print(client.execute("select from users where age > 18"))
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, timeout=None):
+        """
+        Args:
+            host (str): Host of the server.
+            port (int): Port of the server.
+            timeout (float, optional): Socket timeout in seconds.
+        """
+        self.sock = socket.create_connection((host, port), timeout)
+        self.stream = self.sock.makefile("rb")
+
+    def execute(self, command):
+        """
+        Execute a command on the server.
+
+        Args:
+            command (str): The command, on a single line.
+
+        Returns:
+            str: Everything the command printed.
+        """
+        if "\n" in command or "\r" in command:
+            raise ValueError("команда должна занимать одну строку")
+        self.sock.sendall(command.encode("utf-8") + b"\n")
+        header = self.stream.read(RESPONSE_HEADER.size)
+        if len(header) < RESPONSE_HEADER.size:
+            raise ConnectionError("сервер закрыл соединение")
+        (length,) = RESPONSE_HEADER.unpack(header)
+        payload = self.stream.read(length)
+        if len(payload) < length:
+            raise ConnectionError("сервер закрыл соединение")
+        return payload.decode("utf-8")
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,328 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress
+
+
+def new_vector(column_type, values=()):
+    """
+    Create a column vector for the column type.
+
+    ints are stored in array("q"), bools in a bytearray of 0/1 and strings
+    in a list of interned strings.
+
+    Args:
+        column_type (str): "int", "bool" or "str".
+        values (iterable): Encoded values of the column.
+
+    Returns:
+        array, bytearray or list: The column vector.
+    """
+    if column_type == "int":
+        return array("q", values)
+    if column_type == "bool":
+        return bytearray(values)
+    return list(values)
+
+
+def encode_value(column_type, value):
+    """
+    Convert a row value to the value stored in the column vector.
+    """
+    if column_type == "int":
+        return int(value or 0)
+    if column_type == "bool":
+        return 1 if value else 0
+    return sys.intern(str(value if value is not None else ""))
+
+
+def decode_value(column_type, value):
+    """
+    Convert a value stored in the column vector back to a row value.
+    """
+    if column_type == "bool":
+        return bool(value)
+    return value
+
+
+class ColumnarTable:
+    """
+    Table stored as one typed vector per column instead of a list of dicts.
+
+    It behaves like a read-only list of rows: rows are built as dicts only
+    when they are accessed, while filters and updates work on the vectors.
+    source_path is the binary table file the table was read from, as long
+    as the table is not changed; such a table can be scanned by other
+    processes straight from the file.
+    """
+
+    def __init__(self, columns, rows=()):
+        """
+        Args:
+            columns (list): Column definitions like ["ID:int", "name:str"].
+            rows (iterable): Rows to load.
+        """
+        self.columns = list(columns)
+        self.types = dict(column.split(":", 1) for column in self.columns)
+        self.vectors = {name: new_vector(column_type)
+                        for name, column_type in self.types.items()}
+        self.source_path = None
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_vectors(cls, columns, vectors):
+        """
+        Create a table from ready column vectors, in the order of columns.
+        """
+        table = cls(columns)
+        for column, vector in zip(table.columns, vectors):
+            table.vectors[column.split(":", 1)[0]] = vector
+        return table
+
+    def __len__(self):
+        return len(self.vectors["ID"])
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        return {name: decode_value(self.types[name], vector[position])
+                for name, vector in self.vectors.items()}
+
+    def __iter__(self):
+        names = list(self.vectors)
+        values = [
+            map(bool, vector) if self.types[name] == "bool" else vector
+            for name, vector in self.vectors.items()
+        ]
+        for row_values in zip(*values):
+            yield dict(zip(names, row_values))
+
+    def project(self, names):
+        """
+        Get a view of the table with only some of its columns.
+
+        The view shares the column vectors with the table, so no values are
+        copied and its rows decode only the given columns. It must not be
+        modified.
+
+        Args:
+            names (list): Column names in the order of the view.
+
+        Returns:
+            ColumnarTable: The view.
+        """
+        columns = [f"{name}:{self.types[name]}" for name in names]
+        return ColumnarTable.from_vectors(
+            columns, [self.vectors[name] for name in names]
+        )
+
+    def append(self, row):
+        """
+        Append a row to the end of the table.
+        """
+        self.source_path = None
+        for name, vector in self.vectors.items():
+            vector.append(encode_value(self.types[name], row.get(name)))
+
+    def truncate(self, length):
+        """
+        Drop the rows after the first length rows.
+        """
+        self.source_path = None
+        for vector in self.vectors.values():
+            del vector[length:]
+
+    def id_positions(self, ids):
+        """
+        Find positions of rows by their IDs with binary search on the ID vector.
+        """
+        id_vector = self.vectors["ID"]
+        positions = []
+        for row_id in sorted(ids):
+            position = bisect_left(id_vector, row_id)
+            if position < len(id_vector) and id_vector[position] == row_id:
+                positions.append(position)
+        return positions
+
+    def id_range(self, where_clause):
+        """
+        Narrow the rows to check using conditions on ID.
+
+        Rows are kept in ascending ID order, so such conditions are answered
+        by binary search on the ID vector without any index.
+
+        Args:
+            where_clause (list): Conditions in the form (column, operator, value).
+
+        Returns:
+            range: Positions of rows that may match.
+        """
+        id_vector = self.vectors["ID"]
+        low, high = 0, len(id_vector)
+        for column, operator_name, value in where_clause:
+            bounds = value if operator_name == "between" else (value,)
+            if column != "ID" or not all(isinstance(b, int) for b in bounds):
+                continue
+            if operator_name in ("=", ">=", "between"):
+                low = max(low, bisect_left(id_vector, bounds[0]))
+            if operator_name == ">":
+                low = max(low, bisect_right(id_vector, value))
+            if operator_name in ("=", "<=", "between"):
+                high = min(high, bisect_right(id_vector, bounds[-1]))
+            if operator_name == "<":
+                high = min(high, bisect_left(id_vector, value))
+        return range(low, max(low, high))
+
+    def match_positions(self, where_clause, comparators, candidate_ids=None,
+                        bounds=None):
+        """
+        Find positions of rows matching the where clause.
+
+        Every condition filters the positions using only its own column vector.
+
+        Args:
+            where_clause (list): Conditions in the form (column, operator, value).
+            comparators (dict): Functions implementing the where operators.
+            candidate_ids (list, optional): IDs found by an index; only these
+                rows are checked.
+            bounds (range, optional): Only rows at these positions are
+                checked, used to scan a table in chunks.
+
+        Returns:
+            list: Positions of matching rows in ascending order.
+        """
+        if candidate_ids is None:
+            positions = self.id_range(where_clause)
+            if bounds is not None:
+                low = max(positions.start, bounds.start)
+                positions = range(low, max(low, min(positions.stop, bounds.stop)))
+        else:
+            positions = self.id_positions(candidate_ids)
+
+        # bool хранится как 0/1, а 0 == False и 1 == True, поэтому значения
+        # сравниваются без преобразования. Строки сравниваются дороже всего,
+        # поэтому их условия проверяются последними, на меньшем числе строк
+        ordered_clause = sorted(
+            where_clause, key=lambda condition: self.types.get(condition[0]) == "str"
+        )
+        for column, operator_name, value in ordered_clause:
+            vector = self.vectors[column]
+            compare = comparators[operator_name]
+            try:
+                if positions == range(len(self)):
+                    positions = [
+                        position for position, column_value in enumerate(vector)
+                        if compare(column_value, value)
+                    ]
+                else:
+                    positions = [
+                        position for position in positions
+                        if compare(vector[position], value)
+                    ]
+            except TypeError:
+                raise ValueError(
+                    f'нельзя сравнить колонку "{column}" со значением {value!r}'
+                )
+        return list(positions)
+
+    def iter_positions(self, where_clause, comparators, candidate_ids=None):
+        """
+        Lazily yield positions of rows matching the where clause.
+
+        Unlike match_positions, every row is checked against all conditions
+        at once, so the caller may stop as soon as it has enough rows.
+
+        Args:
+            where_clause (list): Conditions in the form (column, operator, value).
+            comparators (dict): Functions implementing the where operators.
+            candidate_ids (list, optional): IDs found by an index; only these
+                rows are checked.
+
+        Yields:
+            int: Positions of matching rows in ascending order.
+        """
+        if candidate_ids is None:
+            positions = self.id_range(where_clause)
+        else:
+            positions = self.id_positions(candidate_ids)
+        yield from self.check_positions(positions, where_clause, comparators)
+
+    def check_positions(self, positions, where_clause, comparators):
+        """
+        Lazily yield the given positions whose rows match the where clause.
+
+        Args:
+            positions (iterable): Positions to check, in any order.
+            where_clause (list): Conditions in the form (column, operator, value).
+            comparators (dict): Functions implementing the where operators.
+
+        Yields:
+            int: Positions of matching rows in the order of positions.
+        """
+        conditions = [
+            (column, self.vectors[column], comparators[operator_name], value)
+            for column, operator_name, value in where_clause
+        ]
+        for position in positions:
+            for column, vector, compare, value in conditions:
+                try:
+                    if not compare(vector[position], value):
+                        break
+                except TypeError:
+                    raise ValueError(
+                        f'нельзя сравнить колонку "{column}" со значением {value!r}'
+                    )
+            else:
+                yield position
+
+    def set_values(self, positions, set_clause):
+        """
+        Set column values of the rows at the given positions.
+
+        Args:
+            positions (list): Positions of the rows to update.
+            set_clause (dict): New values {column: value}.
+
+        Returns:
+            None.
+        """
+        # Все значения проверяются до изменения, чтобы не обновить часть строк
+        self.source_path = None
+        encoded = {}
+        for column, value in set_clause.items():
+            column_type = self.types[column]
+            if column_type == "int" and not isinstance(value, int):
+                raise ValueError(f'колонка "{column}" имеет тип int')
+            encoded[column] = encode_value(column_type, value)
+
+        for column, value in encoded.items():
+            vector = self.vectors[column]
+            for position in positions:
+                vector[position] = value
+
+    def sort_by_id(self):
+        """
+        Reorder the rows by ID, rebuilding every vector in a single pass.
+        """
+        self.source_path = None
+        ids = self.vectors["ID"]
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        self.vectors = {
+            name: new_vector(self.types[name], map(vector.__getitem__, order))
+            for name, vector in self.vectors.items()
+        }
+
+    def delete_ids(self, ids):
+        """
+        Delete rows by their IDs, rebuilding every vector in a single pass.
+        """
+        self.source_path = None
+        ids = set(ids)
+        keep = [row_id not in ids for row_id in self.vectors["ID"]]
+        self.vectors = {
+            name: new_vector(self.types[name], compress(vector, keep))
+            for name, vector in self.vectors.items()
+        }
@@ -1,4 +1,56 @@
 import os
 
 DATA_DIR = "data"
-DEFAULT_FILE_PATH = os.path.join(DATA_DIR, "metadata.json")
\ No newline at end of file
+DEFAULT_FILE_PATH = os.path.join(DATA_DIR, "metadata.json")
+
+TABLE_LOG_EXTENSION = ".log"
+TABLE_INDEX_EXTENSION = ".idx"
+LOCK_EXTENSION = ".lock"
+METADATA_LOCK_NAME = "metadata"
+LOG_COMPACTION_MIN_BYTES = 64 * 1024
+LOG_COMPACTION_RATIO = 0.5
+VACUUM_DEAD_RATIO = 0.3
+
+CACHE_MAX_ENTRIES = 128
+CACHE_MAX_ROWS = 100_000
+
+SORT_MEMORY_ROWS = int(os.environ.get("PRIMITIVE_DB_SORT_ROWS", 100_000))
+
+DISPLAY_PAGE_SIZE = 1000
+STATEMENT_CACHE_SIZE = 256
+
+BUFFER_POOL_MAX_BYTES = int(
+    os.environ.get("PRIMITIVE_DB_BUFFER_POOL_BYTES", 256 * 1024 * 1024)
+)
+
+WRITE_BEHIND_ENABLED = os.environ.get("PRIMITIVE_DB_WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_INTERVAL = 1.0
+WRITE_BEHIND_MAX_PENDING = 100
+
+WAL_SYNC_OPS = int(os.environ.get("PRIMITIVE_DB_WAL_SYNC_OPS", 32))
+WAL_SYNC_INTERVAL_MS = int(os.environ.get("PRIMITIVE_DB_WAL_SYNC_MS", 10))
+
+SCRIPT_ID_CACHE_SIZE = 1000
+
+PARALLEL_SCAN_MIN_ROWS = int(
+    os.environ.get("PRIMITIVE_DB_PARALLEL_SCAN_ROWS", 200_000)
+)
+PARALLEL_SCAN_WORKERS = int(
+    os.environ.get("PRIMITIVE_DB_PARALLEL_SCAN_WORKERS", os.cpu_count() or 1)
+)
+PARALLEL_SCAN_CHUNKS_PER_WORKER = 4
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 7433
+SERVER_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+SERVER_MAX_COMMAND_BYTES = 64 * 1024 * 1024
+
+IMPORT_BATCH_SIZE = 10_000
+IMPORT_FORMATS = (".csv", ".jsonl")
+
+TABLE_FORMATS = {"json": ".json", "binary": ".bin", "segmented": ".seg"}
+SEGMENT_ID_RANGE = 10_000
+TABLE_ENGINES = ("rows", "columnar")
+INDEX_TYPES = ("hash", "ordered")
+WHERE_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "between")
+AGGREGATE_FUNCTIONS = ("count", "sum", "avg", "min", "max")
@@ -1,15 +1,59 @@
+import operator
 import os
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import groupby, islice, repeat
 
+from primitive_db.aggregates import (
+    fold_groups,
+    group_rows,
+    index_aggregate,
+    item_name,
+    value_aggregates,
+)
+from primitive_db.columnar import ColumnarTable
+from primitive_db.constants import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    INDEX_TYPES,
+    STATEMENT_CACHE_SIZE,
+    TABLE_ENGINES,
+    TABLE_FORMATS,
+)
 from primitive_db.decorators import (
     confirm_action,
     create_cacher,
     handle_db_errors,
     log_time,
 )
+from primitive_db.indexes import (
+    find_rows_by_ids,
+    get_index_path,
+    load_indexes,
+    lookup_condition,
+)
+from primitive_db.joins import estimated_rows, hash_join, index_join, plan_join
+from primitive_db.parallel import parallel_match_positions
+from primitive_db.segments import remove_table_path, touched_segments
+from primitive_db.sorting import sorted_rows, top_rows
 from primitive_db.utils import (
+    allocate_ids,
+    append_table_record,
+    append_table_records,
+    bump_table_version,
+    compact_table_log,
     create_record,
-    id_generator,
+    evict_table,
+    get_table_data_path,
+    get_table_log_path,
+    get_table_signature,
+    get_table_version,
+    iter_import_rows,
     load_table_data,
+    load_table_for_read,
+    load_table_indexes,
+    save_table_data,
+    track_table_signature,
     validate_and_convert_types,
 )
 
@@ -80,7 +124,7 @@ def create_table(metadata, table_name, *columns):
         processed_columns.append(f'{column_name}:{data_type}')
     
     
-    metadata[table_name] = {'columns': processed_columns}
+    metadata[table_name] = {'columns': processed_columns, 'next_id': 1}
     print(f'Таблица "{table_name}" успешно создана со столбцами:'
            f'{", ".join(processed_columns)}')
     return metadata
@@ -101,118 +145,1046 @@ def drop_table(metadata, table_name):
     '''
     if table_name in metadata:
         del metadata[table_name]
-        file_path = f"data/{table_name}.json"
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Файл данных '{file_path}' удален")
-        except OSError as e:
-            print(f"Ошибка при удалении файла '{file_path}': {e}")
+        bump_table_version(table_name)
+        evict_table(table_name)
+        table_files = [get_table_data_path(table_name, table_format)
+                       for table_format in TABLE_FORMATS]
+        table_files += [get_table_log_path(table_name), get_index_path(table_name)]
+        for file_path in table_files:
+            try:
+                if os.path.exists(file_path):
+                    remove_table_path(file_path)
+                    print(f"Файл данных '{file_path}' удален")
+            except OSError as e:
+                print(f"Ошибка при удалении файла '{file_path}': {e}")
         return metadata
     else:
         print('Такой таблицы не существует.')
         return None
 
+@handle_db_errors
+def create_index(metadata, table_name, column, index_type='hash'):
+    '''
+    Create an index on a table column.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+        column (str): The column to index.
+        index_type (str): "hash" for equality lookups or "ordered" for
+            ranges over an int column.
+
+    Returns:
+        dict: Updated metadata or None on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    if index_type not in INDEX_TYPES:
+        print(f'Ошибка: Недопустимый тип индекса "{index_type}".'
+              f' Допустимы: {", ".join(INDEX_TYPES)}')
+        return None
+
+    column_types = dict(col.split(':') for col in metadata[table_name]['columns'])
+    if column not in column_types:
+        print(f'Ошибка: Колонка "{column}" не существует в таблице.')
+        print(f'Доступные колонки: {", ".join(column_types)}')
+        return None
+
+    if index_type == 'ordered' and column_types[column] != 'int':
+        print('Ошибка: Упорядоченный индекс строится только по колонкам int.')
+        return None
+
+    index_types = {
+        index_column: index['type']
+        for index_column, index in load_indexes(table_name).items()
+    }
+    if column in index_types:
+        print(f'Индекс по колонке "{column}" уже существует.')
+        return None
+
+    index_types[column] = index_type
+    save_table_data(table_name, load_table_data(table_name), index_types)
+    # Индексы читаются только из файла индексов, копия в метаданных устаревала
+    metadata[table_name].pop('indexes', None)
+
+    print(f'Индекс по колонке "{column}" таблицы "{table_name}" создан.')
+    return metadata
+
+
+COMPARATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'between': lambda row_value, bounds: bounds[0] <= row_value <= bounds[1],
+}
+
+
+def row_matches(row, where_clause):
+    '''
+    Check if a row satisfies every condition of the where clause.
+
+    Args:
+        row (dict): The row to check.
+        where_clause (list): Conditions in the form (column, operator, value).
+
+    Returns:
+        bool: True if the row matches.
+    '''
+    for column, operator_name, value in where_clause:
+        try:
+            if not COMPARATORS[operator_name](row.get(column), value):
+                return False
+        except TypeError:
+            raise ValueError(
+                f'нельзя сравнить колонку "{column}" со значением {value!r}'
+            )
+    return True
+
+
+PREDICATE_OPERATORS = {
+    '=': '==',
+    '!=': '!=',
+    '<': '<',
+    '<=': '<=',
+    '>': '>',
+    '>=': '>=',
+}
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_where_shape(shape):
+    '''
+    Compile the shape of a where clause into a predicate factory.
+
+    The conditions become one expression like
+    row['age'] > v0 and row['name'] == v1, so a row is checked with a single
+    call instead of interpreting every condition for every row. Only column
+    names (as literals) and operators from PREDICATE_OPERATORS get into the
+    expression, the values are parameters of the factory. Compiled shapes
+    are cached, so a query repeated with other values reuses its code.
+
+    Args:
+        shape (tuple): Conditions in the form (column, operator).
+
+    Returns:
+        function: Takes the values of the conditions, both bounds for
+            between, and returns a function checking a row.
+    '''
+    parameters = []
+    expressions = []
+    for number, (column, operator_name) in enumerate(shape):
+        row_value = f'row[{column!r}]'
+        if operator_name == 'between':
+            parameters += [f'low{number}', f'high{number}']
+            expressions.append(f'low{number} <= {row_value} <= high{number}')
+        else:
+            parameters.append(f'v{number}')
+            expressions.append(
+                f'{row_value} {PREDICATE_OPERATORS[operator_name]} v{number}'
+            )
+    return eval(
+        f'lambda {", ".join(parameters)}: '
+        f'lambda row: {" and ".join(expressions)}'
+    )
+
+
+def compile_where_clause(where_clause):
+    '''
+    Get a function checking whether a row matches every condition.
+
+    Args:
+        where_clause (tuple): Conditions in the form (column, operator, value).
+
+    Returns:
+        function: Takes a row and returns True if it matches.
+    '''
+    shape = tuple((column, operator_name)
+                  for column, operator_name, _ in where_clause)
+    values = []
+    for _, operator_name, value in where_clause:
+        values.extend(value if operator_name == 'between' else (value,))
+    return compile_where_shape(shape)(*values)
+
+
+def index_candidate_ids(where_clause, indexes=None):
+    '''
+    Get IDs of the rows that may match the where clause using the indexes.
+
+    Args:
+        where_clause (list): Conditions in the form (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
+
+    Returns:
+        list: IDs from the most selective index or None if no index applies.
+    '''
+    candidate_ids = None
+    for column, operator_name, value in where_clause:
+        if not indexes or column not in indexes:
+            continue
+        ids = lookup_condition(indexes[column], operator_name, value)
+        if ids is not None and (candidate_ids is None
+                                or len(ids) < len(candidate_ids)):
+            candidate_ids = ids
+    return candidate_ids
+
+
+def match_table_positions(table_data, where_clause, indexes=None):
+    '''
+    Find positions of rows of a columnar table matching the where clause.
+
+    Rows found by an index are checked in this process, a full scan of a
+    large table read from a binary file is split between worker processes.
+
+    Args:
+        table_data (ColumnarTable): The table.
+        where_clause (list): Conditions in the form (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
+
+    Returns:
+        list: Positions of matching rows in ascending order.
+    '''
+    candidate_ids = index_candidate_ids(where_clause, indexes)
+    if candidate_ids is None:
+        positions = parallel_match_positions(table_data, where_clause)
+        if positions is not None:
+            return positions
+    return table_data.match_positions(where_clause, COMPARATORS, candidate_ids)
+
+
+def project_rows(rows, columns):
+    '''
+    Lazily keep only the given columns of the rows, in the given order.
+    '''
+    for row in rows:
+        yield {column: row[column] for column in columns}
+
+
+def find_matching_rows(table_data, where_clause, indexes=None, columns=None):
+    '''
+    Find rows matching the where clause.
+
+    If some of the where columns are indexed, only the rows from the most
+    selective index are checked instead of the whole table.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        where_clause (list): Conditions in the form (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
+        columns (list, optional): Columns of the returned rows, by default
+            all. Rows of a columnar table are built from these columns only.
+
+    Returns:
+        list: Matching rows.
+    '''
+    if isinstance(table_data, ColumnarTable):
+        positions = match_table_positions(table_data, where_clause, indexes)
+        if columns is not None:
+            table_data = table_data.project(columns)
+        return [table_data[position] for position in positions]
+
+    candidate_ids = index_candidate_ids(where_clause, indexes)
+    candidates = table_data
+    if candidate_ids is not None:
+        candidates = find_rows_by_ids(table_data, candidate_ids)
+
+    predicate = compile_where_clause(where_clause)
+    try:
+        rows = list(filter(predicate, candidates))
+    except (TypeError, KeyError):
+        # Построчная проверка сообщит, какое условие не подходит к данным
+        rows = [row for row in candidates if row_matches(row, where_clause)]
+    if columns is None:
+        return rows
+    return list(project_rows(rows, columns))
+
+
+def iter_matching_rows(table_data, where_clause=None, indexes=None,
+                       columns=None):
+    '''
+    Lazily yield rows matching the where clause.
+
+    Rows are checked one by one, so the scan stops as soon as the caller
+    stops reading.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value). Without it every row is yielded.
+        indexes (dict, optional): Indexes of the table {column: index}.
+        columns (list, optional): Columns of the yielded rows, by default all.
+
+    Yields:
+        dict: Matching rows.
+    '''
+    if columns is not None and not isinstance(table_data, ColumnarTable):
+        rows = iter_matching_rows(table_data, where_clause, indexes)
+        yield from project_rows(rows, columns)
+        return
+
+    view = table_data if columns is None else table_data.project(columns)
+    if not where_clause:
+        yield from view
+        return
+
+    candidate_ids = index_candidate_ids(where_clause, indexes)
+
+    if isinstance(table_data, ColumnarTable):
+        positions = table_data.iter_positions(where_clause, COMPARATORS,
+                                              candidate_ids)
+        for position in positions:
+            yield view[position]
+        return
+
+    candidates = table_data
+    if candidate_ids is not None:
+        candidates = find_rows_by_ids(table_data, candidate_ids)
+
+    predicate = compile_where_clause(where_clause)
+    for row in candidates:
+        try:
+            matched = predicate(row)
+        except (TypeError, KeyError):
+            matched = row_matches(row, where_clause)
+        if matched:
+            yield row
+
+
+def iter_row_values(table_data, columns, where_clause=None, indexes=None):
+    '''
+    Lazily yield values of some columns of the rows matching the where clause.
+
+    A columnar table is read straight from its column vectors, without
+    building a dict for every row. A full scan of a large table read from
+    a binary file is split between worker processes, like in
+    match_table_positions.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        columns (list): Columns to read.
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
+
+    Yields:
+        tuple: Values of the columns, in the order of columns.
+    '''
+    if not isinstance(table_data, ColumnarTable):
+        for row in iter_matching_rows(table_data, where_clause, indexes):
+            yield tuple(row[column] for column in columns)
+        return
+
+    vectors = [table_data.vectors[column] for column in columns]
+    if not where_clause:
+        yield from zip(*vectors) if vectors else repeat((), len(table_data))
+        return
+    candidate_ids = index_candidate_ids(where_clause, indexes)
+    positions = None
+    if candidate_ids is None:
+        positions = parallel_match_positions(table_data, where_clause)
+    if positions is None:
+        positions = table_data.iter_positions(where_clause, COMPARATORS,
+                                              candidate_ids)
+    for position in positions:
+        yield tuple(vector[position] for vector in vectors)
+
+
+def id_position(table_data, row_id):
+    '''
+    Find the position of a row by its ID, None if there is no such row.
+    '''
+    if isinstance(table_data, ColumnarTable):
+        id_vector = table_data.vectors['ID']
+        position = bisect_left(id_vector, row_id)
+        found = position < len(id_vector) and id_vector[position] == row_id
+    else:
+        position = bisect_left(table_data, row_id, key=lambda row: row['ID'])
+        found = (position < len(table_data)
+                 and table_data[position]['ID'] == row_id)
+    return position if found else None
+
+
+def index_order_positions(table_data, column, descending=False, indexes=None,
+                          where_clause=None):
+    '''
+    Get positions of the rows in the order of a column without sorting.
+
+    Rows are stored in ID order, and an ordered index keeps the IDs in the
+    order of its column. Rows with equal values come in ID order both ways,
+    like after sorting.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        column (str): The column to order by.
+        descending (bool): Order from the largest value.
+        indexes (dict, optional): Indexes of the table {column: index}.
+        where_clause (list, optional): Conditions narrowing the ID range.
+
+    Returns:
+        iterable: Positions in the order of the column, or None if the rows
+            have to be sorted.
+    '''
+    if column == 'ID':
+        positions = range(len(table_data))
+        if isinstance(table_data, ColumnarTable) and where_clause:
+            positions = table_data.id_range(where_clause)
+        return reversed(positions) if descending else positions
+
+    index = (indexes or {}).get(column)
+    if index is None or index['type'] != 'ordered':
+        return None
+    entries = index['entries']
+    if descending:
+        # Равные значения идут по возрастанию ID, как после устойчивой
+        # сортировки: в обратном порядке идут только группы значений
+        entries = (entry
+                   for _, group in groupby(reversed(entries),
+                                           key=operator.itemgetter(0))
+                   for entry in reversed(list(group)))
+    positions = (id_position(table_data, row_id) for _, row_id in entries)
+    return (position for position in positions if position is not None)
+
+
+def iter_rows_at(table_data, positions, where_clause=None, columns=None):
+    '''
+    Lazily yield the rows at the given positions matching the where clause,
+    in the order of the positions.
+    '''
+    if isinstance(table_data, ColumnarTable):
+        view = table_data if columns is None else table_data.project(columns)
+        if where_clause:
+            positions = table_data.check_positions(positions, where_clause,
+                                                   COMPARATORS)
+        for position in positions:
+            yield view[position]
+        return
+
+    predicate = compile_where_clause(where_clause) if where_clause else None
+    for position in positions:
+        row = table_data[position]
+        if predicate is not None:
+            try:
+                matched = predicate(row)
+            except (TypeError, KeyError):
+                matched = row_matches(row, where_clause)
+            if not matched:
+                continue
+        if columns is not None:
+            row = {column: row[column] for column in columns}
+        yield row
+
+
+def sort_page(rows, key, descending, offset=0, stop=None):
+    '''
+    Sort rows and get those at positions offset..stop.
+
+    With stop only stop rows are kept in a heap, otherwise rows that don't
+    fit in SORT_MEMORY_ROWS are sorted on disk.
+
+    Returns:
+        list or iterator: The rows; an iterator if they were sorted on disk.
+    '''
+    if stop is not None:
+        return top_rows(rows, key, stop, descending)[offset:]
+    rows = sorted_rows(rows, key, descending)
+    if isinstance(rows, list):
+        return rows[offset:]
+    return islice(rows, offset, None)
+
+
+def order_rows(table_data, order_by, where_clause=None, indexes=None,
+               columns=None, limit=None, offset=0):
+    '''
+    Find rows matching the where clause sorted by a column.
+
+    Ordered by ID or by a column with an ordered index, the rows are read
+    in that order, so nothing is sorted and the scan stops after limit
+    rows. Otherwise with limit only offset + limit rows are kept in a heap,
+    and a full sort spills sorted runs to temporary files in the data
+    folder once the rows don't fit in SORT_MEMORY_ROWS.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        order_by (tuple): (column, descending).
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
+        columns (list, optional): Columns of the returned rows, by default all.
+        limit (int, optional): Maximum number of rows to return.
+        offset (int): Number of rows to skip.
+
+    Returns:
+        list or iterator: Sorted rows; an iterator if they were sorted
+            on disk.
+    '''
+    column, descending = order_by
+    stop = None if limit is None else offset + limit
+    positions = index_order_positions(table_data, column, descending, indexes,
+                                      where_clause)
+    if positions is not None:
+        rows = iter_rows_at(table_data, positions, where_clause, columns)
+        return list(islice(rows, offset, stop))
+
+    # Колонка сортировки нужна в строках, даже если ее не выбирали
+    read_columns = columns
+    if columns is not None and column not in columns:
+        read_columns = [*columns, column]
+    rows = iter_matching_rows(table_data, where_clause, indexes, read_columns)
+    rows = sort_page(rows, operator.itemgetter(column), descending, offset,
+                     stop)
+
+    if read_columns is columns:
+        return rows
+    if isinstance(rows, list):
+        return list(project_rows(rows, columns))
+    return project_rows(rows, columns)
+
+
+def get_useful_columns(metadata, table_name):
+    '''
+    Get the column definitions of a table without the ID column.
+    '''
+    table_columns = metadata[table_name]['columns']
+    return [col for col in table_columns if not col.startswith('ID:')]
+
+
+def check_row_values(useful_table_columns, values):
+    '''
+    Check the number of values of a row and convert them to the column types.
+
+    Args:
+        useful_table_columns (list): Column definitions without ID.
+        values (list): The values of the row.
+
+    Returns:
+        list: Converted values or None on error.
+    '''
+    if len(values) != len(useful_table_columns):
+        print('Кол-во передаваемых значений ' \
+        'не совпадает с количеством столбцов')
+        print(f"Столбцы: {', '.join(useful_table_columns)}")  
+        return None
+    
+    checked_data = validate_and_convert_types(useful_table_columns, values)
+    if checked_data is None:
+        print('Типы данных столбцов и внесенной информации не совпадают')
+        return None
+    return checked_data
+
+
 @handle_db_errors
 @log_time
 def insert(metadata, table_name, values):
     '''
         Insert a new row into a table.
 
+        The row is appended to the table log, the table file itself is not
+        read or rewritten. The ID is taken from the table sequence.
+
         Args:
                 metadata (dict): The metadata dictionary.
                 table_name (str): The name of the table.
                 values (tuple): The values to insert.
 
         Returns:
-                Updated metadata.
+                dict: The inserted record or None on error.
         '''
 
     if table_name not in metadata:
         print('Такой таблицы не существует.')
         return None
     
-    table_data = load_table_data(table_name)
-    if not table_data:
-        table_data = []
-
-    table_columns = metadata[table_name]['columns']
-    useful_table_columns = [col for col in table_columns if not col.startswith('ID:')]
-    if len(values) != len(useful_table_columns):
-        print('Кол-во передаваемых значений ' \
-        'не совпадает с количеством столбцов')
-        print(f"Столбцы: {', '.join(useful_table_columns)}")  
-        return None
-    
-    checked_data = validate_and_convert_types(useful_table_columns, values)
+    useful_table_columns = get_useful_columns(metadata, table_name)
+    checked_data = check_row_values(useful_table_columns, values)
     if checked_data is None:
-        print('Типы данных столбцов и внесенной информации не совпадают')
         return None
     
-    new_id = id_generator(table_data)
+    new_id = allocate_ids(metadata, table_name)
     new_record = create_record(new_id, checked_data, useful_table_columns)
-    table_data.append(new_record)
+    if not append_table_record(table_name, new_record):
+        return None
     
     print(f"Запись успешно добавлена в таблицу '{table_name}' с ID={new_id}")
-    return table_data
+    return new_record
+
+
+@handle_db_errors
+@log_time
+def insert_rows(metadata, table_name, rows):
+    '''
+    Insert several rows into a table at once.
+
+    Either all rows are inserted or none: every row is checked first, then
+    the IDs are reserved as one block and the rows are appended to the
+    table log with a single write.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+        rows (list): Lists of values to insert.
+
+    Returns:
+        list: The inserted records or None on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    useful_table_columns = get_useful_columns(metadata, table_name)
+    checked_rows = []
+    for row_number, values in enumerate(rows, start=1):
+        checked_data = check_row_values(useful_table_columns, values)
+        if checked_data is None:
+            print(f'Ошибка в строке {row_number}, записи не добавлены.')
+            return None
+        checked_rows.append(checked_data)
+
+    first_id = allocate_ids(metadata, table_name, len(checked_rows))
+    records = [
+        create_record(first_id + offset, checked_data, useful_table_columns)
+        for offset, checked_data in enumerate(checked_rows)
+    ]
+    if not append_table_records(table_name, records):
+        return None
+
+    print(f"Записи успешно добавлены в таблицу '{table_name}': "
+          f"{len(records)}, ID={first_id}..{records[-1]['ID']}")
+    return records
+
+
+@handle_db_errors
+@log_time
+def import_rows(metadata, table_name, file_path):
+    '''
+    Import rows from a CSV or JSONL file into a table.
+
+    The file is read in batches of IMPORT_BATCH_SIZE rows, every batch is
+    checked and gets a block of IDs. The rows are added to the loaded table,
+    which the caller then saves once.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+        file_path (str): Path of the file to import.
+
+    Returns:
+        tuple: (the table with the imported rows, numbers of the segments
+            holding them) or None on error. Nothing is changed on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    if not file_path.endswith(IMPORT_FORMATS):
+        print(f'Ошибка: Поддерживаются файлы {", ".join(IMPORT_FORMATS)}')
+        return None
+
+    if not os.path.exists(file_path):
+        print(f'Файл {file_path} не найден.')
+        return None
+
+    useful_table_columns = get_useful_columns(metadata, table_name)
+    table_data = load_table_data(table_name, metadata[table_name])
+    if table_data is None:
+        table_data = []
+    initial_length = len(table_data)
+    segments = set()
+
+    def add_batch(batch):
+        first_id = allocate_ids(metadata, table_name, len(batch))
+        segments.update(touched_segments(range(first_id,
+                                               first_id + len(batch))))
+        for offset, checked_data in enumerate(batch):
+            table_data.append(
+                create_record(first_id + offset, checked_data,
+                              useful_table_columns)
+            )
+
+    # При ошибке добавленные строки убираются, таблица остается прежней
+    imported = False
+    try:
+        batch = []
+        for line_number, values in iter_import_rows(file_path,
+                                                    useful_table_columns):
+            checked_data = check_row_values(useful_table_columns, values)
+            if checked_data is None:
+                print(f'Ошибка в строке {line_number} файла, '
+                      f'данные не импортированы.')
+                return None
+            batch.append(checked_data)
+            if len(batch) == IMPORT_BATCH_SIZE:
+                add_batch(batch)
+                batch = []
+        if batch:
+            add_batch(batch)
+        imported = True
+    finally:
+        if not imported:
+            if isinstance(table_data, ColumnarTable):
+                table_data.truncate(initial_length)
+            else:
+                del table_data[initial_length:]
+
+    print(f"Импортировано записей в таблицу '{table_name}': "
+          f"{len(table_data) - initial_length}")
+    return table_data, segments
 
 
 cacher = create_cacher()
 @handle_db_errors
 @log_time
-def select(table_data, where_clause=None):
+def select(table_data, where_clause=None, indexes=None, table_name=None,
+           limit=None, offset=0, columns=None, order_by=None):
     '''
         Select rows from a table based on a where clause.
 
+        With limit or offset the rows are filtered lazily and the scan stops
+        once limit rows after offset are found. With columns only these
+        columns of the rows are returned, and a columnar table decodes
+        nothing else. With order_by the rows are sorted, see order_rows.
+
         Args:
                 table_data (list): The list of rows in the table.
-                where_clause (str, optional): The where clause to filter rows.
+                where_clause (list, optional): Conditions in the form
+                        (column, operator, value).
+                indexes (dict, optional): Indexes of the table {column: index}.
+                table_name (str, optional): The name of the table. Results
+                        are cached only when it is given.
+                limit (int, optional): Maximum number of rows to return.
+                offset (int): Number of matching rows to skip.
+                columns (list, optional): Columns to return, by default all.
+                order_by (tuple, optional): (column, descending) to sort by.
 
         Returns:
-                list: Filtered rows.
+                list: Filtered rows, an iterator if they were sorted on disk.
         '''
     
     if not table_data:
         print('Таблица пуста.')
         return None
-        
-    if where_clause is None:
-        return table_data
-        
-    if not isinstance(where_clause, dict) or len(where_clause) == 0:
-        print("Ошибка: where_clause должен быть словарем")
+
+    if order_by is not None and isinstance(order_by[0], tuple):
+        print('Ошибка: Сортировка по агрегатной функции возможна только'
+              ' в запросе с агрегатами.')
         return None
-        
+
     first_row = table_data[0]
-    for column in where_clause.keys():
+    order_columns = [order_by[0]] if order_by is not None else []
+    for column in (columns or []) + order_columns:
         if column not in first_row:
             print(f'Ошибка: Колонка "{column}" не существует в таблице.')
             print(f'Доступные колонки: {", ".join(first_row.keys())}')
             return None
         
-    cache_key = f"select_{str(where_clause)}"
+    paged = limit is not None or offset > 0
+    if where_clause is None and not paged and order_by is None:
+        if columns is None:
+            return table_data
+        if isinstance(table_data, ColumnarTable):
+            return table_data.project(columns)
+        return project_rows(table_data, columns)
+
+    if where_clause is not None:
+        if not isinstance(where_clause, list) or len(where_clause) == 0:
+            print("Ошибка: where_clause должен быть списком условий")
+            return None
+
+        for column, _, _ in where_clause:
+            if column not in first_row:
+                print(f'Ошибка: Колонка "{column}" не существует в таблице.')
+                print(f'Доступные колонки: {", ".join(first_row.keys())}')
+                return None
 
     def execute_query(): 
         '''
         Function to execute the query and cache the result.
         '''  
-        filtered_data = []
-        for row in table_data:
-                if all(row.get(column) == value for column, 
-                       value in where_clause.items()):
-                    filtered_data.append(row)
-        return filtered_data
+        if order_by is not None:
+            return order_rows(table_data, order_by, where_clause, indexes,
+                              columns, limit, offset)
+        if not paged:
+            return find_matching_rows(table_data, where_clause, indexes,
+                                      columns)
+        stop = None if limit is None else offset + limit
+        rows = iter_matching_rows(table_data, where_clause, indexes, columns)
+        return list(islice(rows, offset, stop))
+
+    if table_name is None:
+        return execute_query()
+
+    cache_key = (f"select_{table_name}_v{get_table_version(table_name)}_"
+                 f"{str(where_clause)}")
+    if paged:
+        cache_key += f"_limit{limit}_offset{offset}"
+    if columns is not None:
+        cache_key += f"_columns{columns}"
+    if order_by is not None:
+        cache_key += f"_order{order_by}"
 
     return cacher(cache_key, execute_query)
 
 
+@handle_db_errors
+@log_time
+def aggregate(table_data, table_columns, items, where_clause=None, group_by=(),
+              indexes=None, table_name=None, limit=None, offset=0,
+              order_by=None):
+    '''
+    Compute aggregate functions over the rows matching the where clause.
+
+    The rows are read in a single pass and folded into one state per group,
+    so the query takes memory for the groups only, not for the rows. Some
+    queries, like count(*) without a where clause, are answered from the
+    row count and the indexes without reading the rows at all.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        table_columns (list): Column definitions like ["ID:int", "age:int"].
+        items (tuple): Grouping columns and (function, column) pairs to
+            return. By default the grouping columns are returned.
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value).
+        group_by (tuple): Columns to group the rows by.
+        indexes (dict, optional): Indexes of the table {column: index}.
+        table_name (str, optional): The name of the table. Results are
+            cached only when it is given.
+        limit (int, optional): Maximum number of groups to return.
+        offset (int): Number of groups to skip.
+        order_by (tuple, optional): (item, descending) to sort the groups
+            by, the item being one of items.
+
+    Returns:
+        list: A row per group or None on error.
+    '''
+    column_types = dict(column.split(':', 1) for column in table_columns)
+    items = items or group_by
+    columns = [item[1] if isinstance(item, tuple) else item for item in items]
+    columns += list(group_by)
+    columns += [column for column, _, _ in where_clause or []]
+    for column in columns:
+        if column != '*' and column not in column_types:
+            print(f'Ошибка: Колонка "{column}" не существует в таблице.')
+            print(f'Доступные колонки: {", ".join(column_types)}')
+            return None
+
+    for item in items:
+        if not isinstance(item, tuple):
+            if item not in group_by:
+                print(f'Ошибка: Колонка "{item}" должна быть в group by'
+                      ' или внутри агрегатной функции.')
+                return None
+        elif item[0] in ('sum', 'avg') and column_types[item[1]] != 'int':
+            print(f'Ошибка: Функция {item[0]} применяется только'
+                  ' к колонкам int.')
+            return None
+
+    if order_by is not None and order_by[0] not in items:
+        print(f'Ошибка: Нельзя сортировать по "{item_name(order_by[0])}":'
+              ' сортировать можно только по тому, что есть в списке select.')
+        return None
+
+    def execute_query():
+        '''
+        Function to execute the query and cache the result.
+        '''
+        groups = index_aggregate(table_data, items, where_clause, group_by,
+                                 indexes)
+        if groups is None:
+            aggregates = value_aggregates(items)
+            value_columns = list(group_by) + [column for _, column in aggregates]
+            value_rows = iter_row_values(table_data, value_columns,
+                                         where_clause, indexes)
+            groups = fold_groups(value_rows, len(group_by),
+                                 [function for function, _ in aggregates])
+        rows = group_rows(groups, items, group_by, column_types)
+        if order_by is not None:
+            # Групп немного, они сортируются в памяти
+            item, descending = order_by
+            rows.sort(key=operator.itemgetter(item_name(item)),
+                      reverse=descending)
+        stop = None if limit is None else offset + limit
+        return rows[offset:stop]
+
+    if table_name is None:
+        return execute_query()
+
+    cache_key = (f"aggregate_{table_name}_v{get_table_version(table_name)}_"
+                 f"{items}_{where_clause}_{group_by}_{order_by}_"
+                 f"limit{limit}_offset{offset}")
+    return cacher(cache_key, execute_query)
+
+
+def index_finder(table_data, key, index, where_clause=None, columns=None):
+    '''
+    Get a function finding the rows with a key through an index.
+
+    Args:
+        table_data (list or ColumnarTable): The rows of the table.
+        key (str): The searched column, ID or an indexed one.
+        index (dict): The index of the column, None for ID.
+        where_clause (list, optional): Conditions the found rows must match.
+        columns (list, optional): Columns of the found rows, by default all.
+
+    Returns:
+        function: Takes a key value and returns the matching rows.
+    '''
+    def find_rows(value):
+        if key == 'ID':
+            ids = [value]
+        else:
+            ids = lookup_condition(index, '=', value) or []
+        positions = sorted(
+            position for position in (id_position(table_data, row_id)
+                                      for row_id in ids)
+            if position is not None
+        )
+        return iter_rows_at(table_data, positions, where_clause, columns)
+
+    return find_rows
+
+
+def join_pairs(tables, plan, row_counts):
+    '''
+    Lazily yield pairs of joined rows.
+
+    If the join column of the larger table, or else of the smaller one, is
+    ID or indexed, that table is searched through the index for every row
+    of the other one, so it is never scanned. Otherwise the rows of the
+    smaller table are put in a hash table and the larger one is streamed
+    past it.
+
+    Args:
+        tables (list): (table data, indexes) of the left and the right table.
+        plan (JoinPlan): The plan of the query.
+        row_counts (list): Estimated row counts of the tables.
+
+    Returns:
+        tuple: (pairs, sides), where pairs yields tuples of rows and sides
+            are the numbers of the tables in the order of the tuple.
+    '''
+    smaller = 0 if row_counts[0] <= row_counts[1] else 1
+    sides = [1 - smaller, smaller]
+    # Колонки проецируются только в колоночной таблице: строки построчной
+    # таблицы уже в памяти, копировать их незачем
+    rows = [
+        iter_matching_rows(data, plan.where[number], indexes,
+                           plan.columns[number]
+                           if isinstance(data, ColumnarTable) else None)
+        for number, (data, indexes) in enumerate(tables)
+    ]
+
+    for inner in sides:
+        data, indexes = tables[inner]
+        key = plan.keys[inner]
+        if key != 'ID' and key not in indexes:
+            continue
+        outer = 1 - inner
+        find_inner = index_finder(
+            data, key, indexes.get(key), plan.where[inner],
+            plan.columns[inner] if isinstance(data, ColumnarTable) else None,
+        )
+        pairs = index_join(rows[outer], plan.keys[outer], find_inner)
+        return pairs, (inner, outer)
+
+    larger = 1 - smaller
+    pairs = hash_join(rows[smaller], plan.keys[smaller], rows[larger],
+                      plan.keys[larger])
+    return pairs, (smaller, larger)
+
+
+@handle_db_errors
+@log_time
+def join(metadata, tables, join_on, items=(), where_clause=None, limit=None,
+         offset=0, order_by=None):
+    '''
+    Join two tables on equal values of a column of each.
+
+    Where conditions are checked while each table is read, and only the
+    columns the query uses are read. The tables are joined by an index
+    nested-loop join or by a hash join built on the smaller table, see
+    join_pairs; its size is estimated from the metadata before any rows
+    are read. With order_by the joined rows are sorted like in order_rows.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        tables (tuple): Names of the left and the right table.
+        join_on (tuple): The two columns of the on condition.
+        items (tuple): Columns to return, by default all of both tables.
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value).
+        limit (int, optional): Maximum number of rows to return.
+        offset (int): Number of joined rows to skip.
+        order_by (tuple, optional): (column, descending) to sort by.
+
+    Returns:
+        list: Joined rows with columns named <table>.<column>, an iterator
+            if they were sorted on disk.
+    '''
+    if tables[0] == tables[1]:
+        print('Ошибка: Соединение таблицы с самой собой не поддерживается.')
+        return None
+    table_columns = {table: metadata[table]['columns'] for table in tables}
+    plan = plan_join(tables, table_columns, join_on, items, where_clause,
+                     order_by)
+
+    def execute_query():
+        '''
+        Function to execute the query and cache the result.
+        '''
+        loaded = []
+        row_counts = []
+        for number, table in enumerate(tables):
+            data = load_table_for_read(table, metadata[table],
+                                       plan.where[number], plan.columns[number])
+            loaded.append((data, load_table_indexes(table)))
+            row_counts.append(estimated_rows(metadata[table], data))
+        pairs, sides = join_pairs(loaded, plan, row_counts)
+
+        read_items = plan.items
+        if plan.order_by is not None and plan.order_by[0] not in read_items:
+            # Колонка сортировки нужна в строках, даже если ее не выбирали
+            read_items = (*read_items, plan.order_by[0])
+        fields = [(f'{tables[number]}.{column}', sides.index(number), column)
+                  for number, column in read_items]
+        rows = ({name: pair[side][column] for name, side, column in fields}
+                for pair in pairs)
+
+        stop = None if limit is None else offset + limit
+        if plan.order_by is None:
+            return list(islice(rows, offset, stop))
+        (number, column), descending = plan.order_by
+        key = operator.itemgetter(f'{tables[number]}.{column}')
+        rows = sort_page(rows, key, descending, offset, stop)
+        if read_items is plan.items:
+            return rows
+        names = [field[0] for field in fields[:len(plan.items)]]
+        if isinstance(rows, list):
+            return list(project_rows(rows, names))
+        return project_rows(rows, names)
+
+    # Таблицы читаются только при промахе кеша, поэтому изменения других
+    # процессов нужно заметить до того, как из версий собран ключ
+    for table in tables:
+        track_table_signature(table, get_table_signature(table))
+    cache_key = (f"join_{tables[0]}_v{get_table_version(tables[0])}_"
+                 f"{tables[1]}_v{get_table_version(tables[1])}_{join_on}_"
+                 f"{items}_{where_clause}_{order_by}_"
+                 f"limit{limit}_offset{offset}")
+    return cacher(cache_key, execute_query)
+
+
 def where_clause_check(table_data, where_clause):
     '''
         Check if the where clause is valid.
 
         Args:
                 table_data (list): The list of rows in the table.
-                where_clause (dict): The where clause to filter rows.
+                where_clause (list): Conditions in the form
+                        (column, operator, value).
 
         Returns:
                 bool: True if the where clause is valid, False otherwise.
@@ -221,12 +1193,12 @@ def where_clause_check(table_data, where_clause):
         print('Отсутствует where_clause.')
         return False
 
-    if not isinstance(where_clause, dict):
-        print('where_clause должен быть словарем')
+    if not isinstance(where_clause, list):
+        print('where_clause должен быть списком условий')
         return False
     
     first_row = table_data[0]
-    for column in where_clause.keys():
+    for column, _, _ in where_clause:
         if column not in first_row:
             print(f'Ошибка: Колонка "{column}" не существует в таблице.')
             print(f'Доступные колонки: {", ".join(first_row.keys())}')
@@ -235,18 +1207,50 @@ def where_clause_check(table_data, where_clause):
     return True
 
 
+def convert_set_clause(table_columns, set_clause):
+    '''
+    Convert the values of a set clause to the types of their columns.
+
+    Columns the table doesn't have are left as they are, update reports
+    them.
+
+    Args:
+        table_columns (list): Column definitions like ["ID:int", "age:int"].
+        set_clause (dict): New values {column: value}.
+
+    Returns:
+        dict: The set clause with converted values or None on error.
+    '''
+    columns = [column for column in table_columns
+               if column.split(':', 1)[0] in set_clause]
+    values = validate_and_convert_types(
+        columns, [str(set_clause[column.split(':', 1)[0]]) for column in columns]
+    )
+    if values is None:
+        print('Типы данных столбцов и внесенной информации не совпадают')
+        return None
+    converted = dict(set_clause)
+    for column, value in zip(columns, values):
+        converted[column.split(':', 1)[0]] = value
+    return converted
+
+
 @handle_db_errors
-def update(table_data, set_clause, where_clause):
+def update(table_data, set_clause, where_clause, indexes=None):
     '''
         Update rows in a table based on a where clause.
 
         Args:
                 table_data (list): The list of rows in the table.
                 set_clause (dict): The set clause to update rows.
-                where_clause (dict): The where clause to filter rows.
+                where_clause (list): Conditions in the form
+                        (column, operator, value).
+                indexes (dict, optional): Indexes of the table {column: index}.
+
+        The rows are changed in place in table_data.
 
         Returns:
-                list: Updated rows.
+                list: IDs of the updated rows or None on error.
     '''
     if not table_data:
         print('Таблица пуста.')
@@ -270,38 +1274,135 @@ def update(table_data, set_clause, where_clause):
                 print(f'Ошибка: Колонка "{column}" не существует в таблице.')
                 print(f'Доступные колонки: {", ".join(first_row.keys())}')
                 return None
+
+        if 'ID' in set_clause:
+            print('Ошибка: Колонку "ID" изменять нельзя.')
+            return None
             
-        updated_count = 0
-        for row in table_data:
-            if all(row.get(key) == value for key, value in where_clause.items()):
-                for key, value in set_clause.items():
-                    row[key] = value
-                    updated_count += 1
+        if isinstance(table_data, ColumnarTable):
+            positions = match_table_positions(table_data, where_clause, indexes)
+            table_data.set_values(positions, set_clause)
+            id_vector = table_data.vectors['ID']
+            updated_ids = [id_vector[position] for position in positions]
+        else:
+            updated_ids = []
+            for row in find_matching_rows(table_data, where_clause, indexes):
+                row.update(set_clause)
+                updated_ids.append(row['ID'])
 
+        updated_count = len(updated_ids)
         if updated_count == 0:
             print('Нет строк, удовлетворяющих условиям where_clause.')
         else:
             print(f'Обновлено {updated_count} строк.')
 
-        return table_data
+        return updated_ids
     
     except Exception as e:
         print(f'Ошибка при обновлении: {e}')
         return None
 
 
+@handle_db_errors
+def set_engine(metadata, table_name, engine):
+    '''
+    Choose how a table is kept in memory.
+
+    "rows" keeps a list of dicts, "columnar" keeps one typed vector per
+    column, which takes several times less memory on large tables.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+        engine (str): One of TABLE_ENGINES.
+
+    Returns:
+        dict: Updated metadata or None on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    if engine not in TABLE_ENGINES:
+        print(f'Ошибка: Недопустимый движок "{engine}".'
+              f' Допустимы: {", ".join(TABLE_ENGINES)}')
+        return None
+
+    metadata[table_name]['engine'] = engine
+    print(f'Таблица "{table_name}" хранится в памяти в формате "{engine}".')
+    return metadata
+
+
+@handle_db_errors
+def convert_table(metadata, table_name, table_format):
+    '''
+    Rewrite the table file in another storage format.
+
+    The format is not stored in the metadata: get_table_format reads it
+    from the table files, so the two can't disagree after a crash.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+        table_format (str): "json", "binary" or "segmented".
+
+    Returns:
+        dict: Updated metadata or None on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    if table_format not in TABLE_FORMATS:
+        print(f'Ошибка: Недопустимый формат "{table_format}".'
+              f' Допустимы: {", ".join(TABLE_FORMATS)}')
+        return None
+
+    save_table_data(table_name, load_table_data(table_name),
+                    table_format=table_format,
+                    columns=metadata[table_name]['columns'])
+    # Формат определяется по файлам таблицы, в метаданных его не хранят
+    metadata[table_name].pop('format', None)
+    print(f'Таблица "{table_name}" сохранена в формате "{table_format}".')
+    return metadata
+
+
+@handle_db_errors
+def vacuum(metadata, table_name):
+    '''
+    Rewrite the table files without deleted rows.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        table_name (str): The name of the table.
+
+    Returns:
+        int: Number of removed dead rows or None on error.
+    '''
+    if table_name not in metadata:
+        print('Такой таблицы не существует.')
+        return None
+
+    dead = compact_table_log(table_name)
+    print(f'Таблица "{table_name}" сжата, удалено мертвых строк: {dead}.')
+    return dead
+
+
 @handle_db_errors
 @confirm_action('удаления строки')
-def delete(table_data, where_clause):
+def delete(table_data, where_clause, indexes=None):
     '''
     Delete rows from a table based on a where clause.
 
+    The table list is filtered in place in a single pass.
+
     Args:
         table_data (list): The list of rows in the table.
-        where_clause (dict): The where clause to filter rows.
+        where_clause (list): Conditions in the form (column, operator, value).
+        indexes (dict, optional): Indexes of the table {column: index}.
 
     Returns:
-        list: Updated rows.
+        list: Deleted rows.
     '''
     if not table_data:
         print('Таблица пуста.')
@@ -311,18 +1412,20 @@ def delete(table_data, where_clause):
         return []
 
     try:
-        updated_count = 0
-        for row in table_data:
-            if all(row.get(key) == value for key, value in where_clause.items()):
-                updated_count += 1
-                table_data.remove(row)
+        deleted_rows = find_matching_rows(table_data, where_clause, indexes)
+        deleted_ids = {row['ID'] for row in deleted_rows}
+        if deleted_ids and isinstance(table_data, ColumnarTable):
+            table_data.delete_ids(deleted_ids)
+        elif deleted_ids:
+            table_data[:] = [row for row in table_data
+                             if row['ID'] not in deleted_ids]
 
-        if updated_count == 0:
+        if not deleted_rows:
             print('Нет строк, удовлетворяющих условиям where_clause.')
         else:
-            print(f'Удалено {updated_count} строк.')
+            print(f'Удалено {len(deleted_rows)} строк.')
 
-        return table_data
+        return deleted_rows
     
     except Exception as e:
         print(f'Ошибка при удалении: {e}')
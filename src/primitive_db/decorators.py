@@ -1,6 +1,14 @@
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Iterator
 from functools import wraps
 
+from primitive_db.constants import CACHE_MAX_ENTRIES, CACHE_MAX_ROWS
+
+# В пакетном режиме некому отвечать на вопросы, действия подтверждаются сами
+confirm_state = {"assume_yes": False}
+
 
 def handle_db_errors(func):
     """
@@ -34,7 +42,7 @@ def confirm_action(action_name):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if (
+            if confirm_state["assume_yes"] or (
                 input(
                     f"Вы уверены, что хотите выполнить действие '{action_name}'?"
                       "(y/n): "
@@ -70,11 +78,24 @@ def log_time(function):
     return wrapper
 
 
-def create_cacher():
+def create_cacher(max_entries=CACHE_MAX_ENTRIES, max_rows=CACHE_MAX_ROWS):
     """
     Factory function to create a cacher decorator.
+
+    The cache evicts least recently used results once it holds more than
+    max_entries results or more than max_rows rows in total.
+
+    Args:
+        max_entries (int): Maximum number of cached results.
+        max_rows (int): Maximum total number of cached rows.
     """
-    cache = {}
+    cache = OrderedDict()
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "rows": 0}
+    # Запрос выполняется без замка, так что разные запросы идут параллельно
+    cache_lock = threading.Lock()
+
+    def result_size(result):
+        return len(result) if isinstance(result, list) else 1
 
     def cache_result(key, value_function):
         """
@@ -87,13 +108,40 @@ def create_cacher():
         Returns:
             The cached value.
         """
-        if key in cache:
+        with cache_lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                stats["hits"] += 1
+            else:
+                stats["misses"] += 1
+        if cached is not None:
             print(f"Используется кешированный результат для ключа {key}.")
-            return cache[key]
+            return cached
 
         result = value_function()
-        cache[key] = result
+        # Итератор можно прочитать только один раз
+        if (result is None or isinstance(result, Iterator)
+                or result_size(result) > max_rows):
+            return result
+
+        with cache_lock:
+            if key not in cache:
+                cache[key] = result
+                stats["rows"] += result_size(result)
+            while len(cache) > max_entries or stats["rows"] > max_rows:
+                _, evicted = cache.popitem(last=False)
+                stats["rows"] -= result_size(evicted)
+                stats["evictions"] += 1
+
         print(f"Результат кеширован для ключа {key}.")
         return result
 
+    def cache_stats():
+        """
+        Get hit, miss and eviction counters of the cache.
+        """
+        return {**stats, "entries": len(cache)}
+
+    cache_result.stats = cache_stats
     return cache_result
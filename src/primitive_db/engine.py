@@ -1,20 +1,347 @@
-import shlex
+from contextlib import ExitStack
 
 import prompt
 
-from primitive_db.core import create_table, delete, drop_table, insert, select, update
-from primitive_db.parser import (
-    parse_select_delete_commands,
-    parse_update_command,
-    parser_insert_command,
+from primitive_db.constants import SCRIPT_ID_CACHE_SIZE, WRITE_BEHIND_ENABLED
+from primitive_db.core import (
+    aggregate,
+    cacher,
+    compile_where_shape,
+    convert_set_clause,
+    convert_table,
+    create_index,
+    create_table,
+    delete,
+    drop_table,
+    import_rows,
+    insert,
+    insert_rows,
+    join,
+    select,
+    set_engine,
+    update,
+    vacuum,
 )
+from primitive_db.decorators import confirm_state
+from primitive_db.locks import table_lock
+from primitive_db.parallel import shutdown_scan_pool
+from primitive_db.parser import Command, prepare_statement, prepared_statements
 from primitive_db.utils import (
     display_table_data,
     load_metadata,
     load_table_data,
+    load_table_for_read,
+    load_table_indexes,
+    metadata_transaction,
+    refresh_metadata,
+    release_ids,
     save_metadata,
-    save_table_data,
+    sequence_state,
 )
+from primitive_db.wal import defer_sync, sync_log
+from primitive_db.write_behind import (
+    commit_table_data,
+    commit_table_delete,
+    commit_table_update,
+    defer_flushes,
+    start_flusher,
+    stop_flusher,
+)
+
+# Команды над одной таблицей (имя таблицы - первый аргумент) и те из них,
+# которые меняют метаданные. select читает таблицу под общей блокировкой,
+# остальные пишут под исключительной
+TABLE_COMMANDS = (
+    "create_table", "drop_table", "create_index", "convert_table",
+    "set_engine", "import", "vacuum",
+)
+METADATA_COMMANDS = (
+    "create_table", "drop_table", "create_index", "convert_table", "set_engine",
+)
+
+
+def get_read_columns(statement, table_columns):
+    """
+    Get the columns a select reads, None if it needs whole rows.
+
+    Args:
+        statement (Select): The parsed select.
+        table_columns (list): Column definitions of the table.
+
+    Returns:
+        list: ID and the columns used by the query, or None.
+    """
+    if not statement.items and not statement.group_by:
+        return None
+    columns = ["ID"]
+    order_items = (statement.order_by[0],) if statement.order_by else ()
+    for item in (*statement.items, *statement.group_by, *order_items,
+                 *(condition[0] for condition in statement.where or [])):
+        column = item[1] if isinstance(item, tuple) else item
+        if column != "*" and column not in columns:
+            columns.append(column)
+    # С неизвестной колонкой таблица читается целиком, чтобы сообщение об
+    # ошибке перечислило все колонки
+    names = [column.split(":", 1)[0] for column in table_columns]
+    if not set(columns) <= set(names):
+        return None
+    return columns
+
+
+def get_statement_tables(statement):
+    """
+    Get the names of the tables a statement works with, empty for other
+    commands.
+    """
+    if not isinstance(statement, Command):
+        if getattr(statement, "join", None):
+            return [statement.table, statement.join[0]]
+        return [statement.table]
+    if statement.command in TABLE_COMMANDS and statement.args:
+        return [statement.args[0]]
+    return []
+
+
+def execute_command(metadata, answer):
+    """
+    Execute a single command.
+
+    The command holds the lock of its table: select shares it with other
+    readers, commands that change the table wait for exclusive access.
+    Readers and writers of other tables, in this or other processes, are
+    not blocked.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        answer (str): The command line entered by the user.
+
+    Returns:
+        bool: False if the program should stop, True otherwise.
+    """
+    statement = prepare_statement(answer)
+    if statement is None:
+        return True
+    # Таблицы могли создать или удалить другие процессы
+    refresh_metadata(metadata)
+
+    command = statement.command
+    tables = get_statement_tables(statement)
+    if not tables or (any(table not in metadata for table in tables)
+                      and command != "create_table"):
+        return execute_statement(metadata, statement)
+
+    with ExitStack() as stack:
+        # Таблицы соединения блокируются в порядке имен, чтобы два запроса
+        # не ждали друг друга
+        for table_name in sorted(set(tables)):
+            stack.enter_context(
+                table_lock(table_name, exclusive=command != "select")
+            )
+        if command not in METADATA_COMMANDS:
+            return execute_statement(metadata, statement)
+        with metadata_transaction(metadata):
+            return execute_statement(metadata, statement)
+
+
+def execute_statement(metadata, statement):
+    """
+    Execute a parsed command. The caller holds the locks it needs.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        statement (tuple): The command parsed by prepare_statement.
+
+    Returns:
+        bool: False if the program should stop, True otherwise.
+    """
+    command = statement.command
+    parts = [command]
+    if isinstance(statement, Command):
+        parts.extend(statement.args)
+    match command:
+        case "exit":
+            if len(parts) == 1:
+                print("До свидания!")
+                return False
+            else:
+                print("Exit не требует аргументов")
+
+        case "create_table":
+            if len(parts) < 3:
+                print(
+                    "Использование: create_table <table> <col1:type> "
+                    "[col2:type ...]"
+                )
+            else:
+                table_name = parts[1]
+                columns = parts[2:]
+                if table_name in metadata:
+                    print(f"Таблица '{table_name}' уже существует.")
+                else:
+                    create_table(metadata, table_name, *columns)
+                    save_metadata(metadata)
+
+        case "drop_table":
+            if len(parts) != 2:
+                print("Использование: drop_table <table>")
+            else:
+                table_name = parts[1]
+                if table_name in metadata:
+                    drop_table(metadata, table_name)
+                    save_metadata(metadata)
+                    if table_name not in metadata:
+                        print(f"Таблица {table_name} удалена.")
+                else:
+                    print(f"Таблица '{table_name}' не существует.")
+
+        case "create_index":
+            if len(parts) not in (3, 4):
+                print(
+                    "Использование: create_index <table> <column> "
+                    "[hash|ordered]"
+                )
+            elif create_index(metadata, *parts[1:]):
+                save_metadata(metadata)
+
+        case "convert_table":
+            if len(parts) != 3:
+                print("Использование: convert_table <table> <json|binary|segmented>")
+            elif convert_table(metadata, parts[1], parts[2]):
+                save_metadata(metadata)
+
+        case "set_engine":
+            if len(parts) != 3:
+                print("Использование: set_engine <table> <rows|columnar>")
+            elif set_engine(metadata, parts[1], parts[2]):
+                save_metadata(metadata)
+
+        case "list_tables":
+            if metadata:
+                list_tables = list(metadata.keys())
+                print(f"Таблицы в базе данных: {', '.join(list_tables)}")
+            else:
+                print("В базе данных нет таблиц.")
+
+        case "insert":
+            table_name, rows = statement.table, statement.rows
+            if len(rows) == 1:
+                new_record = insert(metadata, table_name, rows[0])
+            else:
+                new_record = insert_rows(metadata, table_name, rows)
+            if not new_record:
+                return True
+            print(f"Данные успешно добавлены в таблицу '{table_name}'")
+
+        case "import":
+            if len(parts) != 3:
+                print("Использование: import <table> <file.csv|file.jsonl>")
+                return True
+            table_name = parts[1]
+            imported = import_rows(metadata, table_name, parts[2])
+            if imported is None:
+                return True
+            table_data, segments = imported
+            commit_table_data(table_name, table_data, segments)
+
+        case "select":
+            table_name, where_clause = statement.table, statement.where
+            if any(table not in metadata
+                   for table in get_statement_tables(statement)):
+                print("Такой таблицы нет.")
+                return True
+            if statement.join is not None:
+                join_table, *join_on = statement.join
+                data_to_be_showed = join(
+                    metadata, (table_name, join_table), tuple(join_on),
+                    statement.items, where_clause, statement.limit,
+                    statement.offset, statement.order_by,
+                )
+                if data_to_be_showed:
+                    display_table_data(data_to_be_showed,
+                                       f"{table_name} join {join_table}")
+                    print("Данные показаны.")
+                return True
+            table_columns = metadata[table_name]["columns"]
+            table_data = load_table_for_read(
+                table_name, metadata[table_name], where_clause,
+                get_read_columns(statement, table_columns),
+            )
+            indexes = load_table_indexes(table_name)
+            aggregates = [item for item in statement.items
+                          if isinstance(item, tuple)]
+            if aggregates or statement.group_by:
+                data_to_be_showed = aggregate(
+                    table_data, table_columns, statement.items, where_clause,
+                    statement.group_by, indexes, table_name, statement.limit,
+                    statement.offset, statement.order_by,
+                )
+            else:
+                data_to_be_showed = select(table_data, where_clause, indexes,
+                                           table_name, statement.limit,
+                                           statement.offset,
+                                           list(statement.items) or None,
+                                           statement.order_by)
+            if not data_to_be_showed:
+                return True
+            display_table_data(data_to_be_showed, table_name)
+            print("Данные показаны.")
+
+        case "update":
+            _, table_name, set_clause, where_clause = statement
+            if table_name not in metadata:
+                return True
+            # Значения проверяются до изменения строк и записи в лог
+            set_clause = convert_set_clause(metadata[table_name]["columns"],
+                                            set_clause)
+            if set_clause is None:
+                return True
+            table_data = load_table_data(table_name, metadata[table_name])
+            indexes = load_table_indexes(table_name)
+            updated_ids = update(table_data, set_clause, where_clause, indexes)
+            if not updated_ids:
+                return True
+            commit_table_update(table_name, table_data, updated_ids, set_clause)
+            print("Данные обновлены.")
+
+        case "delete":
+            _, table_name, where_clause = statement
+            if table_name not in metadata:
+                print("Такой таблицы нет.")
+                return True
+            table_data = load_table_data(table_name, metadata[table_name])
+            indexes = load_table_indexes(table_name)
+            deleted_rows = delete(table_data, where_clause, indexes)
+            if not deleted_rows:
+                return True
+            commit_table_delete(table_name, table_data, deleted_rows)
+
+        case "vacuum":
+            if len(parts) != 2:
+                print("Использование: vacuum <table>")
+            else:
+                vacuum(metadata, parts[1])
+
+        case "cache_stats":
+            stats = cacher.stats()
+            print(
+                f"Кеш запросов: записей {stats['entries']}, "
+                f"строк {stats['rows']}, попаданий {stats['hits']}, "
+                f"промахов {stats['misses']}, "
+                f"вытеснений {stats['evictions']}"
+            )
+            predicates = compile_where_shape.cache_info()
+            print(
+                f"Подготовленных запросов: {len(prepared_statements)}, "
+                f"скомпилированных условий: {predicates.currsize}"
+            )
+
+        case "help":
+            print_help()
+
+        case _:
+            print(f"Неизвестная команда {command}. Введите 'help'")
+
+    return True
 
 
 def run():
@@ -27,123 +354,70 @@ def run():
     print("Добро пожаловать в DB-проект!")
     print("Вызовите help для просмотра доступных команд.")
     metadata = load_metadata()
-    while True:
-        try:
-            answer = prompt.string("Введите команду: ").strip().lower()
-            if not answer:
-                continue
+    if WRITE_BEHIND_ENABLED:
+        start_flusher()
+    try:
+        while True:
+            try:
+                answer = prompt.string("Введите команду: ").strip()
+                if not answer:
+                    continue
 
-            parts = shlex.split(answer)
-            if not parts:
+                if not execute_command(metadata, answer):
+                    break
+            except KeyboardInterrupt:
+                print("\nПрервано пользователем.")
+                break
+            except IndexError:
                 print("Пустая команда.")
-                continue
-            command = parts[0]
-            args = parts[1:]
-            match command:
-                case "exit":
-                    if len(parts) == 1:
-                        print("До свидания!")
-                        break
-                    else:
-                        print("Exit не требует аргументов")
-
-                case "create_table":
-                    if len(parts) < 3:
-                        print(
-                            "Использование: create_table <table> <col1:type> "
-                            "[col2:type ...]"
-                        )
-                    else:
-                        table_name = parts[1]
-                        columns = parts[2:]
-                        if table_name in metadata:
-                            print(f"Таблица '{table_name}' уже существует.")
-                        else:
-                            create_table(metadata, table_name, *columns)
-                            save_metadata(metadata)
-
-                case "drop_table":
-                    if len(parts) != 2:
-                        print("Использование: drop_table <table>")
-                    else:
-                        table_name = parts[1]
-                        if table_name in metadata:
-                            drop_table(metadata, table_name)
-                            save_metadata(metadata)
-                            if table_name not in metadata:
-                                print(f"Таблица {table_name} удалена.")
-                        else:
-                            print(f"Таблица '{table_name}' не существует.")
-
-                case "list_tables":
-                    if metadata:
-                        list_tables = list(metadata.keys())
-                        print(f"Таблицы в базе данных: {', '.join(list_tables)}")
-                    else:
-                        print("В базе данных нет таблиц.")
-
-                case "insert":
-                    table_name, values = parser_insert_command(args)
-                    if table_name is None:
-                        continue
-                    new_table_data = insert(metadata, table_name, values)
-                    if not new_table_data:
-                        continue
-                    save_table_data(table_name, new_table_data)
-                    print(f"Данные успешно добавлены в таблицу '{table_name}'")
-
-                case "select":
-                    table_name, where_clause = parse_select_delete_commands(args)
-                    if table_name not in metadata:
-                        print("Такой таблицы нет.")
-                        continue
-                    table_data = load_table_data(table_name)
-                    if table_name is None:
-                        continue
-                    data_to_be_showed = select(table_data, where_clause)
-                    if not data_to_be_showed:
-                        continue
-                    display_table_data(data_to_be_showed, table_name)
-                    print("Данные показаны.")
+            except Exception as e:
+                print(f"Неожиданная ошибка: {e}")
+    finally:
+        stop_flusher()
+        sync_log()
+        shutdown_scan_pool()
 
-                case "update":
-                    table_name, set_clause, where_clause = parse_update_command(args)
-                    if table_name is None:
-                        continue
-                    if table_name not in metadata:
-                        continue
-                    table_data = load_table_data(table_name)
-                    updated_data = update(table_data, set_clause, where_clause)
-                    if not updated_data:
-                        continue
-                    save_table_data(table_name, updated_data)
-                    print("Данные обновлены.")
-
-                case "delete":
-                    table_name, where_clause = parse_select_delete_commands(args)
-                    if not where_clause:
-                        table_data = []
-                    if table_name not in metadata:
-                        print("Такой таблицы нет.")
-                        continue
-                    if table_name is None:
-                        continue
-                    table_data = load_table_data(table_name)
-                    deleted_data = delete(table_data, where_clause)
-                    save_table_data(table_name, deleted_data)
-
-                case "help":
-                    print_help()
-
-                case _:
-                    print(f"Неизвестная команда {command}. Введите 'help'")
-        except KeyboardInterrupt:
-            print("\nПрервано пользователем.")
-            break
-        except IndexError:
-            print("Пустая команда.")
-        except Exception as e:
-            print(f"Неожиданная ошибка: {e}")
+
+def run_script(lines):
+    """
+    Execute commands from a script without prompts and confirmations.
+
+    Changed tables stay in memory for the whole script and are saved once
+    at the end, the table logs are synced to disk once as well. IDs are
+    reserved in blocks of SCRIPT_ID_CACHE_SIZE, so the metadata is not
+    rewritten for every insert.
+
+    Args:
+        lines (iterable): Lines of the script, one command per line. Empty
+            lines and lines starting with "#" or "--" are skipped, a
+            trailing ";" is ignored.
+
+    Returns:
+        None.
+    """
+    metadata = load_metadata()
+    confirm_state["assume_yes"] = True
+    sequence_state["cache_size"] = SCRIPT_ID_CACHE_SIZE
+    defer_flushes()
+    defer_sync()
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            answer = line.strip()
+            if not answer or answer.startswith(("#", "--")):
+                continue
+            try:
+                if not execute_command(metadata, answer):
+                    break
+            except Exception as e:
+                print(f"Ошибка в строке {line_number}: {e}")
+    finally:
+        confirm_state["assume_yes"] = False
+        sequence_state["cache_size"] = 1
+        release_ids(metadata)
+        stop_flusher()
+        defer_sync(False)
+        sync_log()
+        shutdown_scan_pool()
 
 
 def print_help():
@@ -153,13 +427,50 @@ def print_help():
     print("create_table <table> <col1:type> [col2:type ...] - создать таблицу")
     print("list_tables - показать список таблиц")
     print("drop_table <table> - удалить таблицу")
-    print("select from <table> [where <conditions>] - выбрать данные")
+    print(
+        "create_index <table> <column> [hash|ordered] - создать индекс по столбцу"
+    )
+    print(
+        "insert into <table> values (<v1>, <v2>) [, (...)] - добавить строки"
+    )
+    print("import <table> <file.csv|file.jsonl> - загрузить строки из файла")
+    print(
+        "select from <table> [where <conditions>] [limit <n>] [offset <n>] "
+        "- выбрать данные"
+    )
+    print(
+        "select <col1>, <col2> from <table> [where <conditions>] "
+        "- выбрать только указанные столбцы"
+    )
+    print(
+        "select <count(*)|sum|avg|min|max(<col>)>, ... from <table> "
+        "[where <conditions>] [group by <cols>] - агрегаты"
+    )
+    print(
+        "select ... [order by <col> [asc|desc]] [limit <n>] "
+        "- отсортировать результат"
+    )
+    print(
+        "select ... from <table> join <table2> on <table>.<col> = <table2>.<col> "
+        "- соединить таблицы"
+    )
     print("update <table> set <col=val> [where <conditions>] - обновить данные")
     print("delete from <table> [where <conditions>] - удалить данные")
+    print("convert_table <table> <json|binary|segmented> - формат файлов таблицы")
+    print("set_engine <table> <rows|columnar> - формат хранения таблицы в памяти")
+    print("vacuum <table> - сжать таблицу, убрав удаленные строки")
+    print("cache_stats - статистика кеша запросов")
     print("exit - выход")
     print("help - эта справка")
     print("\nПримеры:")
     print("  create_table users name:str age:int")
+    print("  create_index users age ordered")
+    print("  select from users where age between 18 and 30 and name != 'ivan'")
     print("  select from users where age = 25 and name = 'dasha'")
+    print("  select from users where age > 18 limit 10 offset 20")
+    print("  select name, count(*), avg(age) from users group by name")
+    print("  select name, age from users order by age desc limit 10")
+    print("  select users.name, orders.total from users join orders"
+          " on users.ID = orders.user_id")
     print("  update users set name = 'ivan' where age = 25")
-    print("  delete from users where id = 1")
+    print("  delete from users where ID = 1")
@@ -0,0 +1,323 @@
+import json
+import os
+from bisect import bisect_left, bisect_right
+
+from primitive_db.constants import DATA_DIR, TABLE_INDEX_EXTENSION
+
+
+def get_index_path(table_name):
+    """
+    Get the path to the index file for a specific table.
+    """
+    if not table_name:
+        return None
+    return os.path.join(DATA_DIR, f"{table_name}{TABLE_INDEX_EXTENSION}")
+
+
+def index_key(value):
+    """
+    Convert a column value to an index key.
+
+    JSON keys are always strings, so the value is encoded to keep 1 and "1"
+    apart.
+    """
+    return json.dumps(value, ensure_ascii=False)
+
+
+def add_to_index(index, row, column):
+    """
+    Add a row to the index of a column.
+
+    Args:
+        index (dict): The index of the column.
+        row (dict): The row to add.
+        column (str): The indexed column.
+
+    Returns:
+        None.
+    """
+    if index["type"] == "ordered":
+        entry = [row.get(column), row["ID"]]
+        entries = index["entries"]
+        position = bisect_left(entries, entry)
+        if position == len(entries) or entries[position] != entry:
+            entries.insert(position, entry)
+        return
+
+    # ID строк одного значения хранятся по возрастанию, поиск - бинарный
+    ids = index["entries"].setdefault(index_key(row.get(column)), [])
+    position = bisect_left(ids, row["ID"])
+    if position == len(ids) or ids[position] != row["ID"]:
+        ids.insert(position, row["ID"])
+
+
+def remove_from_index(index, row, column):
+    """
+    Remove a row from the index of a column.
+
+    Args:
+        index (dict): The index of the column.
+        row (dict): The row to remove.
+        column (str): The indexed column.
+
+    Returns:
+        None.
+    """
+    if index["type"] == "ordered":
+        entry = [row.get(column), row["ID"]]
+        entries = index["entries"]
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+        return
+
+    key = index_key(row.get(column))
+    ids = index["entries"].get(key, [])
+    position = bisect_left(ids, row["ID"])
+    if position < len(ids) and ids[position] == row["ID"]:
+        del ids[position]
+        if not ids:
+            del index["entries"][key]
+
+
+def remove_rows_from_index(index, rows, column):
+    """
+    Remove many rows from the index of a column at once.
+
+    A list of IDs that loses several rows is filtered in one pass instead of
+    being shifted for every removed row.
+
+    Args:
+        index (dict): The index of the column.
+        rows (list): The rows to remove.
+        column (str): The indexed column.
+
+    Returns:
+        None.
+    """
+    if len(rows) == 1:
+        remove_from_index(index, rows[0], column)
+        return
+
+    if index["type"] == "ordered":
+        removed = {(row.get(column), row["ID"]) for row in rows}
+        index["entries"] = [entry for entry in index["entries"]
+                            if tuple(entry) not in removed]
+        return
+
+    removed = {}
+    for row in rows:
+        removed.setdefault(index_key(row.get(column)), set()).add(row["ID"])
+    for key, removed_ids in removed.items():
+        ids = index["entries"].get(key)
+        if ids is None:
+            continue
+        ids[:] = [row_id for row_id in ids if row_id not in removed_ids]
+        if not ids:
+            del index["entries"][key]
+
+
+def build_index(table_data, column, index_type="hash"):
+    """
+    Build an index for a column.
+
+    A hash index maps every value to the ascending list of its IDs, an
+    ordered index is a list of [value, ID] pairs sorted by value.
+
+    Args:
+        table_data (list): The list of rows in the table.
+        column (str): The column to index.
+        index_type (str): "hash" or "ordered".
+
+    Returns:
+        dict: Index in the form {"type": index_type, "entries": ...}.
+    """
+    if index_type == "ordered":
+        entries = sorted([row.get(column), row["ID"]] for row in table_data)
+        return {"type": index_type, "entries": entries}
+
+    # ID в таблице уникальны, проверять повторы не нужно
+    entries = {}
+    for row in table_data:
+        entries.setdefault(index_key(row.get(column)), []).append(row["ID"])
+    for ids in entries.values():
+        ids.sort()
+    return {"type": index_type, "entries": entries}
+
+
+def equal_keys(value):
+    """
+    Get the index keys of all values equal to value.
+
+    A scan compares values with ==, so True matches 1 and False matches 0,
+    while their JSON keys differ. The index looks up all of them to find
+    the same rows as the scan.
+    """
+    if isinstance(value, int) and value in (0, 1):
+        return [index_key(bool(value)), index_key(int(value))]
+    return [index_key(value)]
+
+
+def lookup_ids(index, value):
+    """
+    Get the IDs of the rows whose indexed column equals value.
+    """
+    if index["type"] == "ordered":
+        return lookup_range(index, value, value)
+    found = [index["entries"][key] for key in equal_keys(value)
+             if key in index["entries"]]
+    if len(found) == 1:
+        return found[0]
+    return sorted(row_id for ids in found for row_id in ids)
+
+
+def lookup_range(index, low=None, high=None, include_low=True, include_high=True):
+    """
+    Get the IDs of the rows whose indexed column lies between low and high.
+
+    Args:
+        index (dict): An ordered index.
+        low (int, optional): Lower bound, None for no bound.
+        high (int, optional): Upper bound, None for no bound.
+        include_low (bool): Whether the lower bound is included.
+        include_high (bool): Whether the upper bound is included.
+
+    Returns:
+        list: IDs of the rows in the range.
+    """
+    entries = index["entries"]
+
+    def key(entry):
+        return entry[0]
+
+    if low is None:
+        start = 0
+    elif include_low:
+        start = bisect_left(entries, low, key=key)
+    else:
+        start = bisect_right(entries, low, key=key)
+
+    if high is None:
+        end = len(entries)
+    elif include_high:
+        end = bisect_right(entries, high, key=key)
+    else:
+        end = bisect_left(entries, high, key=key)
+
+    return [entry[1] for entry in entries[start:end]]
+
+
+def lookup_condition(index, operator_name, value):
+    """
+    Get the IDs of the rows matching a single where condition.
+
+    Args:
+        index (dict): The index of the condition column.
+        operator_name (str): One of WHERE_OPERATORS.
+        value: The value of the condition, (low, high) for "between".
+
+    Returns:
+        list: IDs of matching rows or None if the index can't answer.
+    """
+    if operator_name == "=":
+        if index["type"] == "ordered" and not isinstance(value, int):
+            return None
+        return lookup_ids(index, value)
+
+    if index["type"] != "ordered":
+        return None
+
+    bounds = value if operator_name == "between" else (value,)
+    if not all(isinstance(bound, int) for bound in bounds):
+        return None
+
+    match operator_name:
+        case "<":
+            return lookup_range(index, high=value, include_high=False)
+        case "<=":
+            return lookup_range(index, high=value)
+        case ">":
+            return lookup_range(index, low=value, include_low=False)
+        case ">=":
+            return lookup_range(index, low=value)
+        case "between":
+            return lookup_range(index, value[0], value[1])
+        case _:
+            return None
+
+
+def find_rows_by_ids(table_data, ids):
+    """
+    Find rows by their IDs.
+
+    Rows are stored in ascending ID order, so each row is found by binary
+    search instead of a full scan.
+
+    Args:
+        table_data (list): The list of rows in the table.
+        ids (list): IDs of the rows to find.
+
+    Returns:
+        list: Found rows in table order.
+    """
+    rows = []
+    for row_id in sorted(ids):
+        position = bisect_left(table_data, row_id, key=lambda row: row["ID"])
+        if position < len(table_data) and table_data[position]["ID"] == row_id:
+            rows.append(table_data[position])
+    return rows
+
+
+def load_indexes(table_name):
+    """
+    Load the index file of a table.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        dict: Indexes in the form {column: index}. Empty dict if there are none.
+    """
+    index_path = get_index_path(table_name)
+    if not index_path or not os.path.exists(index_path):
+        return {}
+
+    try:
+        with open(index_path, "r", encoding="utf-8") as file:
+            indexes = json.load(file)
+        if not isinstance(indexes, dict):
+            return {}
+        for index in indexes.values():
+            if index.get("type") == "hash":
+                # Старые файлы могли хранить ID не по возрастанию
+                for ids in index["entries"].values():
+                    ids.sort()
+        return indexes
+    except json.JSONDecodeError:
+        print(f"Ошибка, некорректный формат в '{index_path}'.")
+        return {}
+
+
+def save_indexes(table_name, indexes):
+    """
+    Save the indexes of a table to its index file.
+
+    Args:
+        table_name (str): Name of the table.
+        indexes (dict): Indexes in the form {column: index}.
+
+    Returns:
+        None.
+    """
+    index_path = get_index_path(table_name)
+    if not index_path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(indexes, file, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except PermissionError:
+        print(f"Нет прав на запись в файл: {index_path}")
@@ -0,0 +1,193 @@
+from typing import NamedTuple
+
+# В результате соединения колонки называются <таблица>.<колонка>. Колонку
+# можно указать и без таблицы, если она есть только в одной из таблиц; ID
+# есть в обеих, его таблицу нужно указывать всегда.
+
+
+class JoinPlan(NamedTuple):
+    """
+    How to read the tables of select ... from a join b on a.x = b.y.
+
+    tables, keys, where and columns hold a value for each table, the left
+    one first. items and order_by refer to the columns as
+    (number of the table, column).
+    """
+
+    tables: tuple
+    keys: tuple
+    where: tuple
+    columns: tuple
+    items: tuple
+    order_by: tuple = None
+
+
+def resolve_column(reference, table_columns):
+    """
+    Find the table of a column written as <table>.<column> or <column>.
+
+    Args:
+        reference (str): The column as written in the query.
+        table_columns (dict): Column names of each table {table: [names]}.
+
+    Returns:
+        tuple: (number of the table, column).
+
+    Raises:
+        ValueError: If there is no such column or both tables have it.
+    """
+    tables = list(table_columns)
+    table, _, column = reference.rpartition(".")
+    if table:
+        if table not in table_columns or column not in table_columns[table]:
+            raise ValueError(f'колонка "{reference}" не существует')
+        return tables.index(table), column
+
+    found = [number for number, table in enumerate(tables)
+             if reference in table_columns[table]]
+    if not found:
+        raise ValueError(f'колонка "{reference}" не существует')
+    if len(found) > 1:
+        raise ValueError(
+            f'колонка "{reference}" есть в обеих таблицах, укажите таблицу: '
+            f"{tables[0]}.{reference}"
+        )
+    return found[0], reference
+
+
+def plan_join(tables, table_columns, join_on, items=(), where_clause=None,
+              order_by=None):
+    """
+    Resolve the columns of a join query and split its conditions by table.
+
+    Every where condition concerns a single table, so it is checked while
+    that table is read, before the rows are joined.
+
+    Args:
+        tables (tuple): Names of the left and the right table.
+        table_columns (dict): Column definitions of each table
+            {table: ["ID:int", "name:str"]}.
+        join_on (tuple): The two columns of the on condition.
+        items (tuple): Columns to return, by default all of both tables.
+        where_clause (list, optional): Conditions in the form
+            (column, operator, value).
+        order_by (tuple, optional): (column, descending).
+
+    Returns:
+        JoinPlan: The plan of the query.
+
+    Raises:
+        ValueError: If a column is unknown or ambiguous, or the join columns
+            don't belong to different tables or have different types.
+    """
+    column_types = {
+        table: dict(column.split(":", 1) for column in table_columns[table])
+        for table in tables
+    }
+
+    keys = [None, None]
+    for reference in join_on:
+        number, column = resolve_column(reference, column_types)
+        if keys[number] is not None:
+            raise ValueError(
+                "условие on должно связывать колонки двух разных таблиц"
+            )
+        keys[number] = column
+    key_types = [column_types[table][key] for table, key in zip(tables, keys)]
+    if key_types[0] != key_types[1]:
+        raise ValueError(
+            f'колонки "{join_on[0]}" и "{join_on[1]}" разных типов: '
+            f"{key_types[0]} и {key_types[1]}"
+        )
+
+    read_all = not items
+    if items:
+        items = tuple(resolve_column(item, column_types) for item in items)
+    else:
+        items = tuple((number, column) for number, table in enumerate(tables)
+                      for column in column_types[table])
+
+    where = ([], [])
+    for column, operator_name, value in where_clause or []:
+        number, column = resolve_column(column, column_types)
+        where[number].append((column, operator_name, value))
+
+    if order_by is not None:
+        order_by = (resolve_column(order_by[0], column_types), order_by[1])
+
+    # Из каждой таблицы читаются ID, колонка соединения и нужные запросу
+    # колонки; без списка колонок - все
+    columns = ([], [])
+    used = [*items, *((number, condition[0]) for number in (0, 1)
+                      for condition in where[number])]
+    if order_by is not None:
+        used.append(order_by[0])
+    for number, key in enumerate(keys):
+        for column in ("ID", key, *(c for n, c in used if n == number)):
+            if column not in columns[number]:
+                columns[number].append(column)
+
+    return JoinPlan(
+        tables=tuple(tables),
+        keys=tuple(keys),
+        where=tuple(conditions or None for conditions in where),
+        columns=(None, None) if read_all else columns,
+        items=items,
+        order_by=order_by,
+    )
+
+
+def estimated_rows(table_metadata, table_data):
+    """
+    Estimate the number of rows of a table from its metadata.
+
+    IDs are never reused, so the ID sequence counts every row ever inserted
+    without reading the table. Tables created before the sequences are
+    counted by their rows.
+    """
+    if "next_id" in table_metadata:
+        return table_metadata["next_id"] - 1
+    return len(table_data)
+
+
+def hash_join(build_rows, build_key, probe_rows, probe_key):
+    """
+    Join rows with equal keys, keeping only the build rows in memory.
+
+    Args:
+        build_rows (iterable): Rows put in the hash table, the smaller side.
+        build_key (str): Join column of the build rows.
+        probe_rows (iterable): Rows read one by one, the larger side.
+        probe_key (str): Join column of the probe rows.
+
+    Yields:
+        tuple: (build row, probe row) for every pair with equal keys, in the
+            order of the probe rows.
+    """
+    buckets = {}
+    for row in build_rows:
+        buckets.setdefault(row[build_key], []).append(row)
+    if not buckets:
+        return
+    for row in probe_rows:
+        for match in buckets.get(row[probe_key], ()):
+            yield match, row
+
+
+def index_join(outer_rows, outer_key, find_inner):
+    """
+    Join every outer row with the inner rows an index finds for its key.
+
+    Args:
+        outer_rows (iterable): Rows read one by one.
+        outer_key (str): Join column of the outer rows.
+        find_inner (function): Takes a key and returns the inner rows with
+            this key.
+
+    Yields:
+        tuple: (inner row, outer row) for every pair with equal keys, in the
+            order of the outer rows.
+    """
+    for row in outer_rows:
+        for match in find_inner(row[outer_key]):
+            yield match, row
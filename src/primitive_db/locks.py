@@ -0,0 +1,253 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from primitive_db.constants import DATA_DIR, LOCK_EXTENSION, METADATA_LOCK_NAME
+
+try:
+    import fcntl
+except ImportError:
+    # Без fcntl (Windows) таблицы защищены только от потоков своего процесса
+    fcntl = None
+
+# Блокировки таблиц: читатели работают одновременно, писатели одной таблицы -
+# по очереди. Внутри процесса это RWLock, между процессами - flock на файле
+# data/<таблица>.lock, который процесс берет один раз на всех своих
+# пользователей таблицы. Перед ожиданием чужой блокировки вызывается
+# lock_state["before_wait"], чтобы процесс сохранил таблицы, которые он
+# держит, и два процесса не ждали друг друга вечно.
+named_locks = {}
+named_locks_guard = threading.Lock()
+held_locks = threading.local()
+table_holds = set()
+lock_state = {"before_wait": None}
+
+
+class RWLock:
+    """
+    Readers-writer lock for the threads of one process.
+
+    Waiting writers block new readers, so a stream of reads can't starve
+    a write.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+
+    def acquire(self, exclusive=False):
+        with self.condition:
+            if exclusive:
+                self.writers_waiting += 1
+                while self.writer or self.readers:
+                    self.condition.wait()
+                self.writers_waiting -= 1
+                self.writer = True
+            else:
+                while self.writer or self.writers_waiting:
+                    self.condition.wait()
+                self.readers += 1
+
+    def release(self, exclusive=False):
+        with self.condition:
+            if exclusive:
+                self.writer = False
+            else:
+                self.readers -= 1
+            self.condition.notify_all()
+
+
+class FileLock:
+    """
+    flock on a lock file, shared by all threads of the process that use it.
+
+    The caller must already hold the RWLock of the same name, so a shared
+    flock is only upgraded when no other thread of the process uses it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.guard = threading.Lock()
+        self.file = None
+        self.exclusive = False
+        self.users = 0
+
+    def acquire(self, exclusive=False, blocking=True):
+        """
+        Take the lock for one more user.
+
+        Returns:
+            bool: False if blocking is False and another process holds
+                a conflicting lock.
+        """
+        with self.guard:
+            if self.users and (self.exclusive or not exclusive):
+                self.users += 1
+                return True
+            if fcntl is not None:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self.file = open(self.path, "a")
+                operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                if not blocking:
+                    operation |= fcntl.LOCK_NB
+                try:
+                    fcntl.flock(self.file.fileno(), operation)
+                except BlockingIOError:
+                    return False
+            self.exclusive = exclusive
+            self.users += 1
+            return True
+
+    def release(self):
+        """
+        Drop one user, the flock is released with the last one.
+        """
+        with self.guard:
+            self.users -= 1
+            if self.users:
+                return
+            self.exclusive = False
+            if self.file is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+                self.file.close()
+                self.file = None
+
+
+def get_lock_path(name):
+    """
+    Get the path of the lock file of a table or of the metadata.
+    """
+    return os.path.join(DATA_DIR, f"{name}{LOCK_EXTENSION}")
+
+
+def get_named_lock(name):
+    """
+    Get the (RWLock, FileLock) pair of a name, creating it on first use.
+    """
+    with named_locks_guard:
+        if name not in named_locks:
+            named_locks[name] = (RWLock(), FileLock(get_lock_path(name)))
+        return named_locks[name]
+
+
+def get_held_locks():
+    """
+    Get the locks held by the current thread as {name: [exclusive, depth]}.
+    """
+    if not hasattr(held_locks, "names"):
+        held_locks.names = {}
+    return held_locks.names
+
+
+def acquire_named_lock(name, exclusive, blocking):
+    """
+    Take the thread and process locks of a name.
+
+    Returns:
+        bool: False if blocking is False and the lock is busy.
+    """
+    rw_lock, file_lock = get_named_lock(name)
+    held = get_held_locks()
+    rw_lock.acquire(exclusive)
+    if file_lock.acquire(exclusive, blocking=False):
+        return True
+    if not blocking:
+        rw_lock.release(exclusive)
+        return False
+
+    before_wait = lock_state["before_wait"]
+    if before_wait is not None and not held:
+        # Поток ничего не держит, можно отпустить свои таблицы перед ожиданием
+        rw_lock.release(exclusive)
+        before_wait()
+        rw_lock.acquire(exclusive)
+    file_lock.acquire(exclusive)
+    return True
+
+
+@contextmanager
+def named_lock(name, exclusive=False, blocking=True):
+    """
+    Hold the lock of a table or of the metadata.
+
+    The lock is reentrant for the current thread. A thread holding a shared
+    lock can't take the same lock exclusively.
+
+    Args:
+        name (str): Name of the table or METADATA_LOCK_NAME.
+        exclusive (bool): Take the lock for writing.
+        blocking (bool): Wait for the lock. If False and the lock is busy,
+            nothing is taken and the context gets False.
+
+    Yields:
+        bool: True if the lock is held.
+    """
+    held = get_held_locks()
+    if name in held:
+        if exclusive and not held[name][0]:
+            raise RuntimeError(f"блокировку {name} нельзя повысить до записи")
+        held[name][1] += 1
+        try:
+            yield True
+        finally:
+            held[name][1] -= 1
+        return
+
+    if not acquire_named_lock(name, exclusive, blocking):
+        yield False
+        return
+    held[name] = [exclusive, 1]
+    try:
+        yield True
+    finally:
+        del held[name]
+        rw_lock, file_lock = get_named_lock(name)
+        file_lock.release()
+        rw_lock.release(exclusive)
+
+
+def table_lock(table_name, exclusive=False, blocking=True):
+    """
+    Hold the lock of a table: shared for reading, exclusive for writing.
+    """
+    return named_lock(table_name, exclusive, blocking)
+
+
+def metadata_lock(exclusive=False):
+    """
+    Hold the lock of the metadata file.
+    """
+    return named_lock(METADATA_LOCK_NAME, exclusive)
+
+
+def hold_table(table_name):
+    """
+    Keep other processes away from a table with unsaved changes.
+
+    The caller holds the exclusive lock of the table. The process keeps its
+    flock after the lock is released, until release_table_hold.
+    """
+    held = get_held_locks()
+    if table_name not in held or not held[table_name][0]:
+        raise RuntimeError(f"таблица {table_name} не заблокирована для записи")
+    with named_locks_guard:
+        if table_name in table_holds:
+            return
+        table_holds.add(table_name)
+    _, file_lock = get_named_lock(table_name)
+    file_lock.acquire(exclusive=True)
+
+
+def release_table_hold(table_name):
+    """
+    Give up the hold taken with hold_table, if there is one.
+    """
+    with named_locks_guard:
+        if table_name not in table_holds:
+            return
+        table_holds.discard(table_name)
+    _, file_lock = get_named_lock(table_name)
+    file_lock.release()
@@ -1,9 +1,63 @@
 #!/usr/bin/env python3
+import argparse
+import sys
+
+from primitive_db.constants import SERVER_HOST, SERVER_PORT
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="database",
+        description="Простая консольная база данных.",
+    )
+    parser.add_argument(
+        "-f", "--file", metavar="script",
+        help="выполнить команды из файла ('-' - из стандартного ввода)",
+    )
+    parser.add_argument(
+        "-c", "--command", action="append", metavar="command",
+        help="выполнить команду (можно указать несколько раз)",
+    )
+
+    subparsers = parser.add_subparsers(dest="mode")
+    serve_parser = subparsers.add_parser(
+        "serve", help="принимать команды клиентов по TCP",
+    )
+    serve_parser.add_argument(
+        "--host", default=SERVER_HOST, help=f"адрес (по умолчанию {SERVER_HOST})",
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=SERVER_PORT,
+        help=f"порт (по умолчанию {SERVER_PORT})",
+    )
+    return parser.parse_args(argv)
+
+
 def main():
-    from primitive_db.engine import run
+    from primitive_db.engine import run, run_script
+
+    args = parse_args()
+    if args.mode == "serve":
+        from primitive_db.server import run_server
 
-    print("DB project is running!")
-    run()
+        run_server(args.host, args.port)
+    elif args.command:
+        run_script(args.command)
+    elif args.file == "-":
+        run_script(sys.stdin)
+    elif args.file:
+        try:
+            with open(args.file, "r", encoding="utf-8") as file:
+                run_script(file)
+        except OSError as e:
+            print(f"Не удалось открыть файл {args.file}: {e.strerror}")
+            sys.exit(1)
+    else:
+        print("DB project is running!")
+        run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from primitive_db.binary_format import map_binary_table
+from primitive_db.constants import (
+    PARALLEL_SCAN_CHUNKS_PER_WORKER,
+    PARALLEL_SCAN_MIN_ROWS,
+    PARALLEL_SCAN_WORKERS,
+)
+
+# Пул процессов создается при первом параллельном сканировании и живет до
+# shutdown_scan_pool. Процессы запускаются через spawn: родитель может быть
+# многопоточным (сервер, фоновый сброс), а fork копирует занятые блокировки.
+scan_pool_state = {"executor": None, "scans": 0}
+
+
+def get_scan_pool(workers=PARALLEL_SCAN_WORKERS):
+    """
+    Get the process pool for parallel scans, starting it on first use.
+    """
+    if scan_pool_state["executor"] is None:
+        scan_pool_state["executor"] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return scan_pool_state["executor"]
+
+
+def shutdown_scan_pool():
+    """
+    Stop the worker processes of parallel scans.
+
+    Returns:
+        None.
+    """
+    executor = scan_pool_state["executor"]
+    if executor is not None:
+        scan_pool_state["executor"] = None
+        executor.shutdown(cancel_futures=True)
+
+
+def scan_chunk(file_path, where_clause, start, stop):
+    """
+    Find matching rows in a chunk of a binary table file.
+
+    Runs in a worker process. The worker maps the file itself, so only the
+    file path and the conditions are sent to it, and the positions come
+    back packed in bytes.
+
+    Args:
+        file_path (str): Path of the table file.
+        where_clause (list): Conditions in the form (column, operator, value).
+        start (int): First position of the chunk.
+        stop (int): Position after the last one of the chunk.
+
+    Returns:
+        bytes: Positions of matching rows as array("q") bytes.
+    """
+    # Импорт здесь: core сам импортирует этот модуль
+    from primitive_db.core import COMPARATORS
+
+    table = map_binary_table(file_path)
+    positions = table.match_positions(where_clause, COMPARATORS,
+                                      bounds=range(start, stop))
+    return array("q", positions).tobytes()
+
+
+def split_range(rows, chunks):
+    """
+    Split a range of positions into at most chunks consecutive ranges.
+    """
+    size = max(1, -(-len(rows) // chunks))
+    return [range(start, min(start + size, rows.stop))
+            for start in range(rows.start, rows.stop, size)]
+
+
+def parallel_match_positions(table_data, where_clause,
+                             min_rows=PARALLEL_SCAN_MIN_ROWS,
+                             workers=PARALLEL_SCAN_WORKERS):
+    """
+    Find positions of matching rows with several processes.
+
+    Only a table that is exactly its binary file (see
+    ColumnarTable.source_path) is scanned in parallel: the rows to check are
+    split into chunks and every worker filters its chunks straight from the
+    file. Small scans stay in this process, where they are cheaper than
+    sending the work to the pool.
+
+    Args:
+        table_data (ColumnarTable): The table to scan.
+        where_clause (list): Conditions in the form (column, operator, value).
+        min_rows (int): Smallest number of rows to scan in parallel.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list: Positions of matching rows in ascending order, or None if the
+            scan should run in this process.
+    """
+    file_path = getattr(table_data, "source_path", None)
+    if file_path is None or workers < 2:
+        return None
+    rows = table_data.id_range(where_clause)
+    if len(rows) < min_rows:
+        return None
+
+    chunks = split_range(rows, workers * PARALLEL_SCAN_CHUNKS_PER_WORKER)
+    positions = array("q")
+    try:
+        executor = get_scan_pool(workers)
+        futures = [
+            executor.submit(scan_chunk, file_path, list(where_clause),
+                            chunk.start, chunk.stop)
+            for chunk in chunks
+        ]
+        for future in futures:
+            positions.frombytes(future.result())
+    except BrokenProcessPool:
+        # Процесс пула упал - пул пересоздается при следующем сканировании
+        shutdown_scan_pool()
+        return None
+    scan_pool_state["scans"] += 1
+    return positions.tolist()
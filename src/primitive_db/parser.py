@@ -1,34 +1,237 @@
-def parser_insert_command(insert_args):
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from primitive_db.constants import (
+    AGGREGATE_FUNCTIONS,
+    STATEMENT_CACHE_SIZE,
+    WHERE_OPERATORS,
+)
+
+prepared_statements = OrderedDict()
+statements_lock = threading.Lock()
+
+# Один проход по строке: каждая лексема - строка в кавычках (вместе с
+# кавычками), знак препинания, оператор сравнения или слово. Последняя
+# альтернатива ловит символы, с которых не начинается ни одна лексема,
+# например незакрытую кавычку.
+TOKEN_PATTERN = re.compile(
+    r"""
+        "[^"]*" | '[^']*'
+      | [(),;]
+      | != | <= | >= | = | < | >
+      | [^\s(),;=!<>"']+
+      | ["'!]
+    """,
+    re.VERBOSE,
+)
+# Значения insert разбираются отдельным шаблоном: разделители между ними
+# пропускаются, а закрывающая скобка завершает строку значений.
+VALUE_PATTERN = re.compile(
+    r"""[^\s(),;"']+ | "[^"]*" | '[^']*' | \) | ["']""",
+    re.VERBOSE,
+)
+INSERT_PATTERN = re.compile(
+    r"""\s* insert \s+ into \s+ ("[^"]*" | '[^']*' | [^\s(),;=!<>"']+) \s+ values \b""",
+    re.VERBOSE | re.IGNORECASE,
+)
+QUOTES = "\"'"
+COMPARISON_TOKENS = ("=", "!=", "<", "<=", ">", ">=")
+# Литералы заменяются в ключе кеша разобранных команд на ?0, ?1, ...
+PLACEHOLDER_PREFIX = "?"
+
+INSERT_USAGE = "Использование: insert into <table> values (<value1>, <value2>, ...)"
+SELECT_USAGE = (
+    "Использование: select [<column>|<function>(<column>), ...] from <table> "
+    "[join <table> on <column> = <column>] [where <condition>] "
+    "[group by <column>, ...] "
+    "[order by <column> [asc|desc]] [limit <n>] [offset <n>]"
+)
+UPDATE_USAGE = (
+    "Использование: update <table> set <column> = <value> "
+    "where <column> = <value>"
+)
+
+
+class Command(NamedTuple):
+    """A command without its own syntax, like create_table or exit."""
+
+    command: str
+    args: list
+
+
+class Insert(NamedTuple):
+    """insert into <table> values (...), (...)"""
+
+    command: str
+    table: str
+    rows: list
+
+
+class Select(NamedTuple):
+    """
+    select [<items>] from <table> [join ...] [where ...] [group by ...]
+    [order by ...] [limit <n>] [offset <n>]
+
+    items are column names and aggregates as (function, column) pairs,
+    order_by is (column or aggregate, descending) from order by, join is
+    (table, column, column) from join <table> on <column> = <column>.
+    """
+
+    command: str
+    table: str
+    where: list
+    limit: int
+    offset: int
+    items: tuple = ()
+    group_by: tuple = ()
+    order_by: tuple = None
+    join: tuple = None
+
+
+class Update(NamedTuple):
+    """update <table> set <column> = <value> [, ...] where ..."""
+
+    command: str
+    table: str
+    set_clause: dict
+    where: list
+
+
+class Delete(NamedTuple):
+    """delete from <table> [where ...]"""
+
+    command: str
+    table: str
+    where: list
+
+
+def tokenize(command_text):
+    """
+    Split a command into tokens in a single pass.
+
+    Unlike shlex, the case of the text is kept and commas, parentheses and
+    comparison operators are separate tokens even without spaces around
+    them. Quoted strings may contain any of them and keep their quotes, so
+    that they are told apart from words.
+
+    Args:
+        command_text (str): The command line.
+
+    Returns:
+        list: Tokens of the command as strings.
+    """
+    tokens = TOKEN_PATTERN.findall(command_text)
+    for bad_token in ('"', "'", "!"):
+        if bad_token in tokens:
+            if bad_token in QUOTES:
+                raise ValueError("незакрытая кавычка")
+            raise ValueError(f"неожиданный символ {bad_token!r}")
+    return tokens
+
+
+def is_keyword(token, keyword):
+    """
+    Check whether a token is the keyword, in any case.
+    """
+    return token.lower() == keyword
+
+
+def token_text(token):
+    """
+    Get the text of a token without quotes.
+    """
+    if token[0] in QUOTES:
+        return token[1:-1]
+    return token
+
+
+def collect_rows(tokens):
+    """
+    Group the value tokens of insert into rows.
+
+    Args:
+        tokens (list): The tokens after "values".
+
+    Returns:
+        list: Rows of values as text.
+    """
+    rows = []
+    values = []
+    for token in tokens:
+        if token == ")":
+            # Закрывающая скобка завершает строку значений
+            if values:
+                rows.append(values)
+                values = []
+        elif token[0] in QUOTES:
+            values.append(token[1:-1])
+        elif token != "(" and token != ",":
+            values.append(token)
+    if values:
+        rows.append(values)
+    return rows
+
+
+def parse_insert_values(table_name, values_text):
+    """
+    Parse the rows of an insert without tokenizing the whole command.
+
+    Bulk inserts are mostly values, so only values and the ends of rows
+    are matched, while commas, parentheses and spaces are skipped.
+
+    Args:
+        table_name (str): The table token.
+        values_text (str): The text after "values".
+
+    Returns:
+        Insert: The parsed command or None on error.
+    """
+    tokens = VALUE_PATTERN.findall(values_text)
+    if '"' in tokens or "'" in tokens:
+        print("Ошибка разбора команды: незакрытая кавычка")
+        return None
+    rows = collect_rows(tokens)
+    if not rows:
+        print(INSERT_USAGE)
+        return None
+    return Insert("insert", token_text(table_name), rows)
+
+
+def parser_insert_command(tokens):
     """
     Parse the insert command arguments.
 
+    Several rows can be given at once: values (a, 1), (b, 2). Values are
+    kept as text and converted to the column types on insert.
+
     Args:
-        insert_args (list): The arguments of the insert command.
+        tokens (list): The tokens after "insert".
 
     Returns:
-        list: The table name and the values to insert.
+        Insert: The parsed command or None on error.
     """
-    if insert_args[0].lower() != "into":
+    if not tokens or not is_keyword(tokens[0], "into"):
         print('Ожидается ключевое слово "into".')
-        return None, None
+        return None
 
-    if len(insert_args) < 4:
-        print("Использование: insert into <table> values (<value1>, <value2>, ...)")
-        return None, None
+    if len(tokens) < 4:
+        print(INSERT_USAGE)
+        return None
 
-    table_name = insert_args[1]
+    table_name = token_text(tokens[1])
 
-    if insert_args[2].lower() != "values":
+    if not is_keyword(tokens[2], "values"):
         print('Ожидается ключевое слово "values".')
-        return None, None
+        return None
 
-    values = []
-    for arg in insert_args[3:]:
-        cleaned_arg = arg.strip("() ")
-        if cleaned_arg:
-            values.append(cleaned_arg)
+    rows = collect_rows(tokens[3:])
+    if not rows:
+        print(INSERT_USAGE)
+        return None
 
-    return table_name, values
+    return Insert("insert", table_name, rows)
 
 
 def parse_value(value_str):
@@ -46,7 +249,7 @@ def parse_value(value_str):
 
     value_str = value_str.strip()
 
-    if value_str.isdigit():
+    if value_str.removeprefix("-").isdigit():
         return int(value_str)
 
     if value_str.lower() in ("true", "false"):
@@ -55,137 +258,523 @@ def parse_value(value_str):
     return str(value_str)
 
 
-def parse_where_clause(where_args):
+def token_value(token):
+    """
+    Get the value of a literal token. Quoted strings are always strings.
+    """
+    if token[0] in QUOTES:
+        return token[1:-1]
+    if token[0] in "(),;=!<>":
+        return None
+    return parse_value(token)
+
+
+def parse_where_clause(tokens):
     """
     Parse the where command arguments.
 
+    Conditions have the form <column> <operator> <value> or
+    <column> between <low> and <high> and are joined with "and".
+
     Args:
-        where_args (list): The arguments of the insert command.
+        tokens (list): The tokens after "where".
 
     Returns:
-        dict: The dictionary of where arguments.
+        list: Conditions in the form (column, operator, value).
     """
-    if not where_args:
+    if not tokens:
         return None
 
-    where_clause = {}
+    where_clause = []
     i = 0
 
-    while i < len(where_args):
-        if i + 2 >= len(where_args):
+    while i < len(tokens):
+        if i + 2 >= len(tokens):
             print("Некорректное условие where: недостаточно аргументов.")
             return None
 
-        column = where_args[i]
-        operator = where_args[i + 1]
-        value_str = where_args[i + 2]
-
-        if operator != "=":
-            print(f'Оператор {operator} не поддерживается. Используйте "=".')
-            return None
+        column = token_text(tokens[i])
+        operator = tokens[i + 1].lower()
 
-        value = parse_value(value_str)
-        if value is None:
+        if operator not in WHERE_OPERATORS:
+            print(
+                f"Оператор {operator} не поддерживается. "
+                f"Используйте: {', '.join(WHERE_OPERATORS)}."
+            )
             return None
 
-        where_clause[column] = value
+        if operator == "between":
+            if i + 4 >= len(tokens) or not is_keyword(tokens[i + 3], "and"):
+                print("Использование: <column> between <low> and <high>")
+                return None
+            low = token_value(tokens[i + 2])
+            high = token_value(tokens[i + 4])
+            if low is None or high is None:
+                return None
+            value = (low, high)
+            i += 5
+        else:
+            value = token_value(tokens[i + 2])
+            if value is None:
+                return None
+            i += 3
 
-        i += 3
+        where_clause.append((column, operator, value))
 
-        if i < len(where_args):
-            if where_args[i].lower() == "and":
+        if i < len(tokens):
+            if is_keyword(tokens[i], "and"):
                 i += 1
                 continue
             else:
-                print(f"Ожидается 'and', получено {where_args[i]}.")
+                print(f"Ожидается 'and', получено {tokens[i]}.")
                 return None
 
     return where_clause
 
 
-def parse_select_delete_commands(select_args):
+def parse_page_clause(tokens):
+    """
+    Split the trailing limit and offset clauses off the tokens.
+
+    Args:
+        tokens (list): The tokens of the command.
+
+    Returns:
+        tuple: (other tokens, limit, offset) or None on error. limit is
+            None if it is not given.
+    """
+    limit, offset = None, 0
+    while len(tokens) >= 2 and tokens[-2].lower() in ("limit", "offset"):
+        keyword, number = tokens[-2].lower(), tokens[-1]
+        if not number.isdigit():
+            print(f"{keyword} должен быть неотрицательным целым числом.")
+            return None
+        if keyword == "limit":
+            limit = int(number)
+        else:
+            offset = int(number)
+        tokens = tokens[:-2]
+    return tokens, limit, offset
+
+
+def parse_column_list(tokens):
+    """
+    Parse column names separated by commas.
+
+    Args:
+        tokens (list): The tokens of the list.
+
+    Returns:
+        tuple: Column names or None on error.
+    """
+    if not tokens:
+        print("Ожидается имя колонки.")
+        return None
+    columns = []
+    for i, token in enumerate(tokens):
+        if i % 2 == 0:
+            if token in ("(", ")", ","):
+                print(f"Ожидается имя колонки, получено {token}.")
+                return None
+            columns.append(token_text(token))
+        elif token != ",":
+            print(f"Ожидается ',', получено {token}.")
+            return None
+    if len(tokens) % 2 == 0:
+        print("Ожидается имя колонки после ','.")
+        return None
+    return tuple(columns)
+
+
+def parse_select_items(tokens):
+    """
+    Parse the columns and aggregate functions between select and from.
+
+    Args:
+        tokens (list): The tokens before "from", like count ( * ) , name.
+
+    Returns:
+        tuple: Column names and (function, column) pairs or None on error.
+    """
+    items = []
+    i = 0
+    while i < len(tokens):
+        if i + 1 < len(tokens) and tokens[i + 1] == "(":
+            function = tokens[i].lower()
+            if function not in AGGREGATE_FUNCTIONS:
+                print(
+                    f"Функция {tokens[i]} не поддерживается. "
+                    f"Используйте: {', '.join(AGGREGATE_FUNCTIONS)}."
+                )
+                return None
+            if i + 3 >= len(tokens) or tokens[i + 3] != ")":
+                print(f"Использование: {function}(<column>)")
+                return None
+            column = token_text(tokens[i + 2])
+            if column == "*" and function != "count":
+                print("* допускается только в count(*).")
+                return None
+            items.append((function, column))
+            i += 4
+        else:
+            if tokens[i] in ("(", ")", ","):
+                print(f"Ожидается имя колонки, получено {tokens[i]}.")
+                return None
+            items.append(token_text(tokens[i]))
+            i += 1
+
+        if i < len(tokens):
+            if tokens[i] != "," or i + 1 == len(tokens):
+                print(f"Ожидается ',' и следующий столбец, получено {tokens[i]}.")
+                return None
+            i += 1
+    return tuple(items)
+
+
+def split_group_clause(tokens):
+    """
+    Split the trailing group by clause off the tokens.
+
+    Returns:
+        tuple: (other tokens, grouping columns) or None on error.
+    """
+    for i in range(2, len(tokens) - 1):
+        if is_keyword(tokens[i], "group") and is_keyword(tokens[i + 1], "by"):
+            group_by = parse_column_list(tokens[i + 2:])
+            if group_by is None:
+                return None
+            return tokens[:i], group_by
+    return tokens, ()
+
+
+def split_order_clause(tokens):
+    """
+    Split the trailing order by clause off the tokens.
+
+    Returns:
+        tuple: (other tokens, (column or aggregate, descending) or None), or
+            None on error.
+    """
+    for i in range(2, len(tokens) - 1):
+        if is_keyword(tokens[i], "order") and is_keyword(tokens[i + 1], "by"):
+            order_tokens = tokens[i + 2:]
+            descending = False
+            if order_tokens and order_tokens[-1].lower() in ("asc", "desc"):
+                descending = order_tokens[-1].lower() == "desc"
+                order_tokens = order_tokens[:-1]
+            items = parse_select_items(order_tokens) if order_tokens else ()
+            if items is None:
+                return None
+            if len(items) != 1:
+                print("Использование: order by <column> [asc|desc]")
+                return None
+            return tokens[:i], (items[0], descending)
+    return tokens, None
+
+
+def split_join_clause(tokens):
+    """
+    Split the join clause following the table name off the tokens.
+
+    Args:
+        tokens (list): The tokens starting with "from <table>".
+
+    Returns:
+        tuple: (other tokens, (table, column, column) or None), or None on
+            error.
+    """
+    if len(tokens) < 3 or not is_keyword(tokens[2], "join"):
+        return tokens, None
+    join_tokens = tokens[3:8]
+    if (len(join_tokens) < 5 or not is_keyword(join_tokens[1], "on")
+            or join_tokens[3] != "="):
+        print("Использование: join <table> on <table>.<column> = <table>.<column>")
+        return None
+    join = (token_text(join_tokens[0]), token_text(join_tokens[2]),
+            token_text(join_tokens[4]))
+    return tokens[:2] + tokens[8:], join
+
+
+def parse_select_delete_commands(tokens, command="select"):
     """
-    Parse the SELECT command arguments.
+    Parse the SELECT and DELETE command arguments.
 
     Args:
-        select_args (list): The arguments of the Select command.
+        tokens (list): The tokens after the command name.
+        command (str): "select" or "delete".
 
     Returns:
-        list: list of commands or None
+        Select or Delete: The parsed command or None on error.
     """
-    if len(select_args) < 2:
-        print("Использование: select from <table> [where <condition>]")
-        return None, None
+    items = ()
+    if command == "select":
+        from_position = next(
+            (i for i, token in enumerate(tokens) if is_keyword(token, "from")),
+            0,
+        )
+        if from_position:
+            items = parse_select_items(tokens[:from_position])
+            if items is None:
+                return None
+            if items == ("*",):
+                items = ()
+            tokens = tokens[from_position:]
+
+    if len(tokens) < 2:
+        print(SELECT_USAGE)
+        return None
 
-    if select_args[0].lower() != "from":
+    if not is_keyword(tokens[0], "from"):
         print('Ожидается ключевое слово "from"')
-        return None, None
+        return None
+
+    page_clause = parse_page_clause(tokens)
+    if page_clause is None:
+        return None
+    tokens, limit, offset = page_clause
 
-    table_name = select_args[1]
+    order_clause = split_order_clause(tokens)
+    if order_clause is None:
+        return None
+    tokens, order_by = order_clause
+
+    group_clause = split_group_clause(tokens)
+    if group_clause is None:
+        return None
+    tokens, group_by = group_clause
+
+    join_clause = split_join_clause(tokens)
+    if join_clause is None:
+        return None
+    tokens, join = join_clause
+
+    table_name = token_text(tokens[1])
     where_clause = None
 
-    if len(select_args) > 2 and select_args[2].lower() == "where":
-        where_clause = parse_where_clause(select_args[3:])
+    if len(tokens) > 2 and is_keyword(tokens[2], "where"):
+        where_clause = parse_where_clause(tokens[3:])
         if where_clause is None:
             print("Нет условия.")
-            return None, None
+            return None
 
-    return table_name, where_clause
+    if command == "delete":
+        if limit is not None or offset or group_by or order_by or join:
+            print("delete не поддерживает limit, offset, group by, order by"
+                  " и join.")
+            return None
+        return Delete(command, table_name, where_clause)
+    if join and (group_by or any(isinstance(item, tuple) for item in items)
+                 or (order_by and isinstance(order_by[0], tuple))):
+        print("join не поддерживает агрегатные функции и group by.")
+        return None
+    return Select(command, table_name, where_clause, limit, offset, items,
+                  group_by, order_by, join)
 
 
-def parse_update_command(update_args):
+def parse_update_command(tokens):
     """
     Parse UPDATE command in format: update <table> set <column> = \
-        <value> where <column> = <value>
+        <value> [, <column> = <value> ...] where <conditions>
 
     Args:
-        update_args (list): The arguments after 'update' command
+        tokens (list): The tokens after 'update' command
 
     Returns:
-        tuple: (table_name, set_clause, where_clause) or (None, None, None) on error
+        Update: The parsed command or None on error
     """
-    if len(update_args) < 8:
-        print(
-            "Использование: update <table> set <column> = <value> " \
-            "where <column> = <value>"
-        )
-        return None, None, None
+    if len(tokens) < 8:
+        print(UPDATE_USAGE)
+        return None
+
+    table_name = token_text(tokens[0])
+
+    if not is_keyword(tokens[1], "set"):
+        print('Ожидается "set" после имени таблицы')
+        return None
+
+    set_clause = {}
+    i = 2
+    while True:
+        if i + 2 >= len(tokens) or tokens[i + 1] != "=":
+            print('Ожидается "=" в SET условии')
+            return None
+        set_value = token_value(tokens[i + 2])
+        if set_value is None:
+            return None
+        set_clause[token_text(tokens[i])] = set_value
+        i += 3
+        if i < len(tokens) and tokens[i] == ",":
+            i += 1
+            continue
+        break
+
+    if i >= len(tokens) or not is_keyword(tokens[i], "where"):
+        print('Ожидается "where" после значения SET')
+        return None
+
+    where_clause = parse_where_clause(tokens[i + 1:])
+    if where_clause is None:
+        return None
+
+    return Update("update", table_name, set_clause, where_clause)
+
+
+def parse_tokens(tokens):
+    """
+    Parse the tokens of a command other than insert into its syntax tree.
+
+    Args:
+        tokens (list): Tokens of the command.
+
+    Returns:
+        Command, Insert, Select, Update or Delete: The parsed command or
+            None on error or for an empty command.
+    """
+    if tokens and tokens[-1] == ";":
+        tokens = tokens[:-1]
+    if not tokens:
+        return None
+
+    command = tokens[0].lower()
+    args = tokens[1:]
+    match command:
+        case "insert":
+            return parser_insert_command(args)
+        case "select" | "delete":
+            return parse_select_delete_commands(args, command)
+        case "update":
+            return parse_update_command(args)
+        case _:
+            return Command(command, [token_text(token) for token in args])
+
+
+def parse_statement(command_text):
+    """
+    Parse a command into its syntax tree.
+
+    Args:
+        command_text (str): The command line.
+
+    Returns:
+        Command, Insert, Select, Update or Delete: The parsed command or
+            None on error or for an empty command.
+    """
+    insert_head = INSERT_PATTERN.match(command_text)
+    if insert_head:
+        return parse_insert_values(insert_head[1], command_text[insert_head.end():])
 
     try:
-        table_name = update_args[0]
+        tokens = tokenize(command_text)
+    except ValueError as e:
+        print(f"Ошибка разбора команды: {e}")
+        return None
+    return parse_tokens(tokens)
 
-        if update_args[1].lower() != "set":
-            print('Ожидается "set" после имени таблицы')
-            return None, None, None
 
-        if update_args[5].lower() != "where":
-            print('Ожидается "where" после значения SET')
-            return None, None, None
+def parameterize(tokens):
+    """
+    Replace the literal values of a command with placeholders.
 
-        set_column = update_args[2]
-        if update_args[3] != "=":
-            print('Ожидается "=" в SET условии')
-            return None, None, None
+    A literal is a value compared with a column or assigned to it: the
+    token after a comparison operator and the bounds of between. The
+    columns of join ... on <column> = <column> are not literals.
 
-        set_value = parse_value(update_args[4])
-        if set_value is None:
-            return None, None, None
+    Args:
+        tokens (list): Tokens of the command.
 
-        set_clause = {set_column: set_value}
+    Returns:
+        tuple: (tokens with placeholders, {placeholder: value}).
+    """
+    template = list(tokens)
+    values = {}
+    for i in range(2, len(tokens)):
+        previous = tokens[i - 1]
+        literal = previous in COMPARISON_TOKENS or is_keyword(previous, "between")
+        if is_keyword(previous, "and") and i >= 3:
+            literal = is_keyword(tokens[i - 3], "between")
+        if previous == "=" and i >= 3 and is_keyword(tokens[i - 3], "on"):
+            literal = False
+        if not literal or tokens[i][0] in "(),;=!<>":
+            continue
+        placeholder = f"{PLACEHOLDER_PREFIX}{len(values)}"
+        values[placeholder] = token_value(tokens[i])
+        template[i] = placeholder
+    return template, values
+
+
+def bind_values(statement, values):
+    """
+    Put the values of a command into the statement parsed from its template.
 
-        where_column = update_args[6]
-        if update_args[7] != "=":
-            print('Ожидается "=" в WHERE условии')
-            return None, None, None
+    Args:
+        statement (Select, Update or Delete): The statement with
+            placeholders.
+        values (dict): Values of the placeholders.
 
-        where_value = parse_value(update_args[8] if len(update_args) > 8 else "")
-        if where_value is None:
-            return None, None, None
+    Returns:
+        Select, Update or Delete: A copy of the statement with the values.
+    """
+    if not values:
+        return statement
+
+    def bind(value):
+        if isinstance(value, tuple):
+            return tuple(bind(bound) for bound in value)
+        if isinstance(value, str):
+            return values.get(value, value)
+        return value
+
+    changes = {}
+    if statement.where:
+        changes["where"] = [(column, operator_name, bind(value))
+                            for column, operator_name, value in statement.where]
+    if isinstance(statement, Update):
+        changes["set_clause"] = {column: bind(value)
+                                 for column, value in statement.set_clause.items()}
+    return statement._replace(**changes)
+
+
+def prepare_statement(command_text, max_entries=STATEMENT_CACHE_SIZE):
+    """
+    Parse a command, reusing the result for a command of the same shape.
 
-        where_clause = {where_column: where_value}
+    Literal values are replaced with placeholders (see parameterize) and
+    parsed statements are cached by the resulting text, so a query repeated
+    with other values is neither parsed again nor compiled again: the
+    values are bound into a copy of the cached statement. Commands with
+    errors and inserts, which are rarely repeated, are not cached.
 
-        return table_name, set_clause, where_clause
+    Args:
+        command_text (str): The command line.
+        max_entries (int): Maximum number of cached statements.
 
-    except Exception as e:
-        print(f"Ошибка парсинга UPDATE: {e}")
-        return None, None, None
+    Returns:
+        Command, Insert, Select, Update or Delete: The parsed command or
+            None on error.
+    """
+    command_text = command_text.strip()
+    if INSERT_PATTERN.match(command_text):
+        return parse_statement(command_text)
+    try:
+        tokens = tokenize(command_text)
+    except ValueError as e:
+        print(f"Ошибка разбора команды: {e}")
+        return None
+    template, values = parameterize(tokens)
+    key = " ".join(template)
+
+    with statements_lock:
+        statement = prepared_statements.get(key)
+        if statement is not None:
+            prepared_statements.move_to_end(key)
+            return bind_values(statement, values)
+
+    statement = parse_tokens(template)
+    if not isinstance(statement, (Select, Update, Delete)):
+        # Остальные команды не кешируются, их аргументы не подставляются
+        return statement if statement is None else parse_tokens(tokens)
+    with statements_lock:
+        prepared_statements[key] = statement
+        if len(prepared_statements) > max_entries:
+            prepared_statements.popitem(last=False)
+    return bind_values(statement, values)
@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+from bisect import bisect_left
+
+from primitive_db.binary_format import encode_table, read_binary_table
+from primitive_db.columnar import ColumnarTable, new_vector
+from primitive_db.constants import SEGMENT_ID_RANGE
+from primitive_db.wal import sync_directory, sync_file
+
+MANIFEST_NAME = "manifest.json"
+SEGMENT_EXTENSION = ".bin"
+
+# Сегментированная таблица - папка data/<таблица>.seg: сегмент k хранит строки
+# с ID от k * SEGMENT_ID_RANGE + 1 до (k + 1) * SEGMENT_ID_RANGE в двоичном
+# формате, manifest.json - каталог сегментов. Измененный сегмент пишется в
+# новый файл <k>-<версия>.bin, и только после этого манифест атомарно
+# переключается на него, так что после сбоя таблица остается в прежнем виде.
+manifest_cache = {}
+
+
+def get_manifest_path(table_path):
+    """
+    Get the path of the segment directory of a segmented table.
+    """
+    return os.path.join(table_path, MANIFEST_NAME)
+
+
+def segment_number(row_id, id_range=SEGMENT_ID_RANGE):
+    """
+    Get the number of the segment that holds a row ID.
+    """
+    return (row_id - 1) // id_range
+
+
+def read_manifest(table_path):
+    """
+    Read the segment directory of a table, reusing it while its file is
+    unchanged.
+
+    Args:
+        table_path (str): Path of the table folder.
+
+    Returns:
+        dict: {"version", "columns", "id_range", "segments"}, where segments
+            is a list of {"number", "file", "first_id", "last_id", "rows",
+            "bytes"} in ID order. None if the table has no manifest.
+    """
+    manifest_path = get_manifest_path(table_path)
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = manifest_cache.get(manifest_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    manifest_cache[manifest_path] = (signature, manifest)
+    return manifest
+
+
+def get_segmented_signature(table_path):
+    """
+    Get the signature of a segmented table as (manifest mtime, table bytes).
+
+    The size is the size of all segments, so the buffer pool can account
+    for the memory the decoded table takes.
+    """
+    manifest = read_manifest(table_path)
+    if manifest is None:
+        return None
+    mtime = os.stat(get_manifest_path(table_path)).st_mtime_ns
+    return (mtime, sum(segment["bytes"] for segment in manifest["segments"]))
+
+
+def id_bounds(where_clause):
+    """
+    Get the range of IDs the where clause can match.
+
+    Args:
+        where_clause (list): Conditions in the form (column, operator, value).
+
+    Returns:
+        tuple: (lowest ID, highest ID), None for an open end.
+    """
+    low, high = None, None
+    for column, operator_name, value in where_clause or []:
+        bounds = value if operator_name == "between" else (value,)
+        if column != "ID" or not all(isinstance(b, int) for b in bounds):
+            continue
+        if operator_name in ("=", ">=", ">", "between"):
+            bound = bounds[0] + 1 if operator_name == ">" else bounds[0]
+            low = bound if low is None else max(low, bound)
+        if operator_name in ("=", "<=", "<", "between"):
+            bound = bounds[-1] - 1 if operator_name == "<" else bounds[-1]
+            high = bound if high is None else min(high, bound)
+    return low, high
+
+
+def read_segmented_table(table_path, id_low=None, id_high=None, names=None):
+    """
+    Read a segmented table, or only the segments that may hold an ID range
+    and only some of the columns.
+
+    Args:
+        table_path (str): Path of the table folder.
+        id_low (int, optional): Lowest ID to read.
+        id_high (int, optional): Highest ID to read.
+        names (list, optional): Names of the columns to read, by default all.
+
+    Returns:
+        ColumnarTable: Rows of the read segments.
+    """
+    manifest = read_manifest(table_path)
+    if manifest is None:
+        raise FileNotFoundError(get_manifest_path(table_path))
+
+    segments = [
+        segment for segment in manifest["segments"]
+        if (id_low is None or segment["last_id"] >= id_low)
+        and (id_high is None or segment["first_id"] <= id_high)
+    ]
+    if not segments and manifest["segments"]:
+        # Хотя бы один сегмент нужен, чтобы проверить имена столбцов
+        segments = manifest["segments"][:1]
+
+    columns = [column for column in manifest["columns"]
+               if names is None or column.split(":", 1)[0] in names]
+    vectors = [new_vector(column.split(":", 1)[1]) for column in columns]
+    for segment in segments:
+        part = read_binary_table(os.path.join(table_path, segment["file"]),
+                                 names)
+        for column, vector in zip(columns, vectors):
+            vector.extend(part.vectors[column.split(":", 1)[0]])
+    return ColumnarTable.from_vectors(columns, vectors)
+
+
+def touched_segments(ids, id_range=SEGMENT_ID_RANGE):
+    """
+    Get the numbers of the segments holding the given row IDs.
+    """
+    return {segment_number(row_id, id_range) for row_id in ids}
+
+
+def slice_rows(columns, data, start, stop):
+    """
+    Get the rows at positions start..stop of table data.
+    """
+    if isinstance(data, ColumnarTable):
+        return ColumnarTable.from_vectors(columns, [
+            data.vectors[column.split(":", 1)[0]][start:stop]
+            for column in columns
+        ])
+    return data[start:stop]
+
+
+def write_manifest(table_path, manifest):
+    """
+    Atomically replace the segment directory of a table.
+    """
+    manifest_path = get_manifest_path(table_path)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+        sync_file(file)
+    os.replace(tmp_path, manifest_path)
+
+
+def write_segmented_table(table_path, columns, data, segments=None,
+                          id_range=SEGMENT_ID_RANGE):
+    """
+    Write table data as segments, rewriting only the given segments.
+
+    Args:
+        table_path (str): Path of the table folder.
+        columns (list): Column definitions like ["ID:int", "name:str"].
+        data (list or ColumnarTable): All rows of the table in ID order.
+        segments (set, optional): Numbers of the segments that changed.
+            By default every segment is written.
+        id_range (int): Number of IDs per segment for a new table.
+
+    Returns:
+        int: Number of written segments.
+    """
+    os.makedirs(table_path, exist_ok=True)
+    manifest = read_manifest(table_path)
+    version = manifest["version"] + 1 if manifest else 1
+    if manifest is None or manifest["columns"] != columns:
+        segments = None
+    else:
+        id_range = manifest["id_range"]
+
+    if isinstance(data, ColumnarTable):
+        ids = data.vectors["ID"]
+    else:
+        ids = [row["ID"] for row in data]
+    if segments is None:
+        segments = touched_segments(ids, id_range)
+        entries = {}
+    else:
+        entries = {segment["number"]: segment for segment in manifest["segments"]}
+
+    for number in sorted(segments):
+        start = bisect_left(ids, number * id_range + 1)
+        stop = bisect_left(ids, (number + 1) * id_range + 1)
+        if start == stop:
+            # Все строки сегмента удалены
+            entries.pop(number, None)
+            continue
+        file_name = f"{number}-{version}{SEGMENT_EXTENSION}"
+        content = encode_table(columns, slice_rows(columns, data, start, stop))
+        with open(os.path.join(table_path, file_name), "wb") as file:
+            file.write(content)
+            sync_file(file)
+        entries[number] = {
+            "number": number, "file": file_name,
+            "first_id": ids[start], "last_id": ids[stop - 1],
+            "rows": stop - start, "bytes": len(content),
+        }
+
+    write_manifest(table_path, {
+        "version": version, "columns": columns, "id_range": id_range,
+        "segments": [entries[number] for number in sorted(entries)],
+    })
+    sync_directory(table_path)
+    remove_unused_segments(table_path)
+    return len(segments)
+
+
+def remove_unused_segments(table_path):
+    """
+    Remove segment files the manifest doesn't refer to, left by a rewrite
+    or by a crash in the middle of one.
+
+    Returns:
+        int: Number of removed files.
+    """
+    manifest = read_manifest(table_path)
+    if manifest is None:
+        return 0
+    used = {segment["file"] for segment in manifest["segments"]}
+    removed = 0
+    for file_name in os.listdir(table_path):
+        unused_segment = (file_name.endswith(SEGMENT_EXTENSION)
+                          and file_name not in used)
+        if unused_segment or file_name == f"{MANIFEST_NAME}.tmp":
+            os.remove(os.path.join(table_path, file_name))
+            removed += 1
+    return removed
+
+
+def remove_table_path(path):
+    """
+    Remove a table file or the folder of a segmented table.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,165 @@
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from primitive_db.client import encode_response
+from primitive_db.constants import (
+    SERVER_HOST,
+    SERVER_MAX_COMMAND_BYTES,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    WRITE_BEHIND_ENABLED,
+)
+from primitive_db.decorators import confirm_state
+from primitive_db.engine import execute_command
+from primitive_db.parallel import shutdown_scan_pool
+from primitive_db.utils import load_metadata
+from primitive_db.wal import sync_log
+from primitive_db.write_behind import start_flusher, stop_flusher
+
+# Команды печатают результат через print. Пока команда клиента выполняется,
+# ее вывод попадает в буфер этого клиента, остальной вывод - в консоль сервера.
+client_output = contextvars.ContextVar("client_output", default=None)
+
+
+class ClientOutput(io.TextIOBase):
+    """
+    Replacement for sys.stdout that sends output to the current client.
+    """
+
+    def __init__(self, console):
+        self.console = console
+
+    def write(self, text):
+        buffer = client_output.get()
+        if buffer is None:
+            return self.console.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if client_output.get() is None:
+            self.console.flush()
+
+
+def execute_client_command(metadata, command_text):
+    """
+    Execute a command of a client and collect its output.
+
+    It runs in a worker thread, so the event loop keeps serving other
+    connections while the command scans a table. Commands on different
+    tables and reads of the same table run in parallel.
+
+    Args:
+        metadata (dict): The metadata dictionary shared by all clients.
+        command_text (str): The command line.
+
+    Returns:
+        tuple: (False if the client asked to exit, output of the command).
+    """
+    output = io.StringIO()
+    token = client_output.set(output)
+    try:
+        keep_open = execute_command(metadata, command_text)
+    except Exception as e:
+        print(f"Неожиданная ошибка: {e}")
+        keep_open = True
+    finally:
+        client_output.reset(token)
+    return keep_open, output.getvalue()
+
+
+async def handle_client(reader, writer, metadata, executor):
+    """
+    Serve the commands of one connection until it is closed or exits.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                writer.write(encode_response("Команда слишком длинная.\n"))
+                break
+            if not line:
+                break
+
+            command_text = line.decode("utf-8", errors="replace").strip()
+            if not command_text:
+                keep_open, output = True, ""
+            else:
+                keep_open, output = await loop.run_in_executor(
+                    executor, execute_client_command, metadata, command_text
+                )
+            writer.write(encode_response(output))
+            await writer.drain()
+            if not keep_open:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    """
+    Accept clients and execute their commands until the server is stopped.
+
+    All clients share the metadata and the tables loaded in memory.
+
+    Args:
+        host (str): Host to listen on.
+        port (int): Port to listen on.
+        workers (int): Number of threads executing commands.
+
+    Returns:
+        None.
+    """
+    metadata = load_metadata()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_client(reader, writer, metadata,
+                                                 executor),
+            host, port, limit=SERVER_MAX_COMMAND_BYTES,
+        )
+        addresses = ", ".join(
+            f"{address[0]}:{address[1]}"
+            for address in (sock.getsockname() for sock in server.sockets)
+        )
+        print(f"Сервер слушает {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT):
+    """
+    Run the database server until it is interrupted.
+
+    Args:
+        host (str): Host to listen on.
+        port (int): Port to listen on.
+
+    Returns:
+        None.
+    """
+    # У сервера нет пользователя, который подтвердил бы удаление
+    confirm_state["assume_yes"] = True
+    console = sys.stdout
+    sys.stdout = ClientOutput(console)
+    if WRITE_BEHIND_ENABLED:
+        start_flusher()
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        print("\nСервер остановлен.")
+    finally:
+        stop_flusher()
+        sync_log()
+        shutdown_scan_pool()
+        sys.stdout = console
+        confirm_state["assume_yes"] = False
@@ -0,0 +1,116 @@
+import heapq
+import json
+import os
+import tempfile
+from itertools import islice
+
+from primitive_db.constants import DATA_DIR, SORT_MEMORY_ROWS
+
+# Отсортированные серии внешней сортировки пишутся во временные файлы в папке
+# data: в POSIX файл удаляется сразу после создания, поэтому после сбоя
+# от сортировки ничего не остается.
+
+
+def top_rows(rows, key, count, descending=False):
+    """
+    Get the first rows in sort order, keeping only count rows in a heap.
+
+    Takes O(n log count) time and O(count) memory. Rows with equal keys
+    keep their order.
+
+    Args:
+        rows (iterable): Rows to sort.
+        key (function): Sort key of a row.
+        count (int): Number of rows to return.
+        descending (bool): Sort from the largest key.
+
+    Returns:
+        list: The first count rows in sort order.
+    """
+    if descending:
+        return heapq.nlargest(count, rows, key=key)
+    return heapq.nsmallest(count, rows, key=key)
+
+
+def write_run(rows):
+    """
+    Write a sorted run of rows to a temporary file, one JSON row per line.
+
+    Returns:
+        file: The run file, positioned at its start.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", dir=DATA_DIR,
+                                 prefix="sort-", suffix=".run")
+    run.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    """
+    Lazily read the rows of a run file.
+    """
+    for line in run:
+        yield json.loads(line)
+
+
+def merge_runs(chunks, key, descending):
+    """
+    Sort chunks of rows into runs on disk and lazily merge them.
+
+    Args:
+        chunks (iterator): Lists of rows, at most the memory budget each.
+        key (function): Sort key of a row.
+        descending (bool): Sort from the largest key.
+
+    Yields:
+        dict: Rows in sort order.
+    """
+    runs = []
+    try:
+        for chunk in chunks:
+            chunk.sort(key=key, reverse=descending)
+            runs.append(write_run(chunk))
+            chunk.clear()
+        yield from heapq.merge(*(read_run(run) for run in runs), key=key,
+                               reverse=descending)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def sorted_rows(rows, key, descending=False, memory_rows=SORT_MEMORY_ROWS):
+    """
+    Sort rows within a memory budget.
+
+    Rows that fit in memory_rows are sorted in memory. Otherwise the rows are
+    read in chunks of memory_rows, every chunk is sorted and written to
+    a temporary file, and the files are merged while the result is read.
+    Rows with equal keys keep their order.
+
+    Args:
+        rows (iterable): Rows to sort.
+        key (function): Sort key of a row.
+        descending (bool): Sort from the largest key.
+        memory_rows (int): Maximum number of rows sorted in memory.
+
+    Returns:
+        list or iterator: Rows in sort order; a list if they fit in memory.
+    """
+    rows = iter(rows)
+    chunk = list(islice(rows, memory_rows))
+    next_chunk = list(islice(rows, memory_rows))
+    if not next_chunk:
+        chunk.sort(key=key, reverse=descending)
+        return chunk
+
+    pending = [chunk, next_chunk]
+
+    def chunks():
+        while pending:
+            yield pending.pop(0)
+        while rest := list(islice(rows, memory_rows)):
+            yield rest
+
+    return merge_runs(chunks(), key, descending)
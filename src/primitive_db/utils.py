@@ -1,9 +1,104 @@
+import csv
 import json
 import os
+from contextlib import contextmanager
+from itertools import islice
 
 from prettytable import PrettyTable
 
-from primitive_db.constants import DATA_DIR, DEFAULT_FILE_PATH
+from primitive_db.binary_format import (
+    map_binary_table,
+    read_binary_columns,
+    read_binary_table,
+    write_binary_table,
+)
+from primitive_db.buffer_pool import (
+    evict_pooled,
+    get_files_signature,
+    get_pooled,
+    is_dirty,
+    put_dirty,
+    put_pooled,
+)
+from primitive_db.columnar import ColumnarTable
+from primitive_db.constants import (
+    DATA_DIR,
+    DEFAULT_FILE_PATH,
+    DISPLAY_PAGE_SIZE,
+    LOG_COMPACTION_MIN_BYTES,
+    LOG_COMPACTION_RATIO,
+    TABLE_FORMATS,
+    TABLE_LOG_EXTENSION,
+    VACUUM_DEAD_RATIO,
+)
+from primitive_db.indexes import (
+    add_to_index,
+    build_index,
+    find_rows_by_ids,
+    get_index_path,
+    load_indexes,
+    remove_rows_from_index,
+    save_indexes,
+)
+from primitive_db.locks import (
+    hold_table,
+    metadata_lock,
+    release_table_hold,
+    table_lock,
+)
+from primitive_db.segments import (
+    get_segmented_signature,
+    id_bounds,
+    read_manifest,
+    read_segmented_table,
+    remove_table_path,
+    remove_unused_segments,
+    touched_segments,
+    write_segmented_table,
+)
+from primitive_db.wal import (
+    append_log_lines,
+    register_write,
+    repair_log_tail,
+    sync_directory,
+    sync_file,
+    sync_log,
+)
+
+table_versions = {}
+# Подписи файлов таблиц, из которых они читались последний раз: если файлы
+# изменил другой процесс, кешированные результаты запросов устаревают
+table_signatures = {}
+metadata_state = {"signature": None}
+dead_rows = {}
+# Выделенные, но еще не выданные ID таблиц: [следующий ID, граница блока,
+# подпись файлов таблицы после последней записи этого процесса]
+id_reservations = {}
+sequence_state = {"cache_size": 1}
+
+
+def get_table_version(table_name):
+    """
+    Get the version of a table. It changes after every write to the table.
+    """
+    return table_versions.get(table_name, 0)
+
+
+def bump_table_version(table_name):
+    """
+    Mark the table as changed so cached query results are not reused.
+    """
+    table_versions[table_name] = get_table_version(table_name) + 1
+
+
+def track_table_signature(table_name, signature):
+    """
+    Change the version of a table if its files changed since the last read,
+    for example because another process wrote to it.
+    """
+    if table_signatures.get(table_name) != signature:
+        table_signatures[table_name] = signature
+        bump_table_version(table_name)
 
 
 def load_metadata(file_path=DEFAULT_FILE_PATH, create_if_missing=True):
@@ -13,12 +108,19 @@ def load_metadata(file_path=DEFAULT_FILE_PATH, create_if_missing=True):
     Args:
         file_path (str): Path to the JSON file.
 
+    Tables are checked for the traces of a crash before the metadata is
+    returned, see recover_tables.
+
     Returns:
         dict: Metadata as dictionary. Returns empty dict on error.
     """
     try:
-        with open(file_path, "r") as file:
-            return json.load(file)
+        with metadata_lock():
+            with open(file_path, "r") as file:
+                metadata = json.load(file)
+            metadata_state["signature"] = get_files_signature(file_path)
+        recover_tables(metadata)
+        return metadata
     except FileNotFoundError:
         print(f"Файла {file_path} еще нет")
         return {}
@@ -54,79 +156,909 @@ def save_metadata(metadata):
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(metadata, file, indent=4, ensure_ascii=False)
+        tmp_path = f"{file_path}.tmp"
+        with metadata_lock(exclusive=True):
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(metadata, file, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+            metadata_state["signature"] = get_files_signature(file_path)
+        # Метаданные попадают на диск вместе со следующей группой записей
+        register_write(file_path, operations=0)
     except PermissionError:
         print(f"Нет прав на запись в файл: {file_path}")
 
 
-def get_table_data_path(table_name):
+def refresh_metadata(metadata, file_path=DEFAULT_FILE_PATH):
+    """
+    Reload the metadata in place if another process has changed its file.
+
+    The metadata is changed under the exclusive metadata lock, table by
+    table, so it is never seen empty.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+        file_path (str): Path to the JSON file.
+
+    Returns:
+        bool: True if the metadata was reloaded.
+    """
+    if get_files_signature(file_path) == metadata_state["signature"]:
+        return False
+    with metadata_lock(exclusive=True):
+        signature = get_files_signature(file_path)
+        if signature == metadata_state["signature"]:
+            # Пока ждали блокировку, метаданные перечитал другой поток
+            return False
+        try:
+            with open(file_path, "r") as file:
+                fresh_metadata = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        # Словарь не очищается: потоки, читающие его без блокировки, не
+        # должны видеть схему пустой или заполненной наполовину
+        metadata.update(fresh_metadata)
+        for table_name in metadata.keys() - fresh_metadata.keys():
+            del metadata[table_name]
+        metadata_state["signature"] = signature
+    return True
+
+
+@contextmanager
+def metadata_transaction(metadata):
+    """
+    Hold the metadata lock while the metadata is changed and saved.
+
+    The metadata is reloaded first, so changes made by other processes are
+    not overwritten by save_metadata.
+
+    Args:
+        metadata (dict): The metadata dictionary.
+
+    Yields:
+        dict: The up-to-date metadata.
+    """
+    with metadata_lock(exclusive=True):
+        refresh_metadata(metadata)
+        yield metadata
+
+
+def recover_tables(metadata):
+    """
+    Bring the table files to a consistent state after a crash.
+
+    Temporary files of interrupted checkpoints are removed, a partly written
+    last entry is cut off every table log, and the ID sequence is moved past
+    the IDs already written to the log. The log entries themselves are
+    replayed when the table is loaded. Tables locked by another process are
+    in use and are left alone.
+
+    Args:
+            metadata (dict): The metadata dictionary.
+
+    Returns:
+            None.
+    """
+    logged_next_ids = {}
+    for table_name in list(metadata):
+        with table_lock(table_name, exclusive=True, blocking=False) as locked:
+            if not locked:
+                continue
+            paths = [get_table_data_path(table_name, table_format)
+                     for table_format in TABLE_FORMATS]
+            paths.append(get_index_path(table_name))
+            for path in paths:
+                if os.path.exists(f"{path}.tmp"):
+                    os.remove(f"{path}.tmp")
+            if get_table_format(table_name) == "segmented":
+                remove_unused_segments(get_table_data_path(table_name))
+
+            log_path = get_table_log_path(table_name)
+            if repair_log_tail(log_path):
+                print(f"Журнал '{log_path}' восстановлен после сбоя.")
+
+            logged_ids = [
+                entry["row"].get("ID", 0) for entry in read_table_log(table_name)
+                if isinstance(entry.get("row"), dict)
+            ]
+            if logged_ids:
+                logged_next_ids[table_name] = max(logged_ids) + 1
+
+    if not logged_next_ids:
+        return
+    with metadata_transaction(metadata):
+        changed = False
+        for table_name, logged_next_id in logged_next_ids.items():
+            table_metadata = metadata.get(table_name, {})
+            next_id = table_metadata.get("next_id")
+            if next_id is not None and logged_next_id > next_id:
+                table_metadata["next_id"] = logged_next_id
+                changed = True
+        if changed:
+            save_metadata(metadata)
+
+
+def get_table_format(table_name):
+    """
+    Get the storage format of a table from the data file that exists on disk.
+
+    Returns:
+        str: "binary" or "segmented" if the table was converted to that
+        format, "json" otherwise.
+    """
+    for table_format in ("binary", "segmented"):
+        path = os.path.join(DATA_DIR, f"{table_name}{TABLE_FORMATS[table_format]}")
+        if os.path.exists(path):
+            return table_format
+    return "json"
+
+
+def get_table_data_path(table_name, table_format=None):
     """
     Get the path to the data file for a specific table.
+
+    Args:
+        table_name (str): Name of the table.
+        table_format (str, optional): Storage format. By default the format
+            of the existing table file is used.
+    """
+    if not table_name:
+        return None
+    if table_format is None:
+        table_format = get_table_format(table_name)
+    return os.path.join(DATA_DIR, f"{table_name}{TABLE_FORMATS[table_format]}")
+
+
+def get_table_log_path(table_name):
+    """
+    Get the path to the append-only log file for a specific table.
     """
     if not table_name:
         return None
-    return os.path.join(DATA_DIR, f"{table_name}.json")
+    return os.path.join(DATA_DIR, f"{table_name}{TABLE_LOG_EXTENSION}")
+
+
+def get_table_signature(table_name):
+    """
+    Get the signature of the table files used to validate pooled table data.
+    """
+    file_path = get_table_data_path(table_name)
+    log_path = get_table_log_path(table_name)
+    if file_path.endswith(TABLE_FORMATS["segmented"]):
+        return (get_segmented_signature(file_path),
+                get_files_signature(log_path)[0])
+    return get_files_signature(file_path, log_path)
+
+
+def get_indexes_signature(table_name):
+    """
+    Get the signature of the files the table indexes are loaded from.
+    """
+    return get_files_signature(get_index_path(table_name),
+                               get_table_log_path(table_name))
+
+
+def get_indexes_pool_key(table_name):
+    """
+    Get the buffer pool key of the table indexes.
+    """
+    return get_index_path(table_name)
+
+
+def evict_table(table_name):
+    """
+    Remove the table and its indexes from the buffer pool.
+    """
+    evict_pooled(table_name)
+    evict_pooled(get_indexes_pool_key(table_name))
+    id_reservations.pop(table_name, None)
+    release_table_hold(table_name)
 
 
-def load_table_data(table_name):
+def keep_id_reservation(table_name, old_signature):
     """
-    Load data from a JSON file.
+    Keep the reserved ID block of a table valid after a write of this process.
+
+    The block stays valid only if nobody else wrote to the table since it
+    was reserved, see allocate_ids.
+
+    Args:
+            table_name (str): Name of the table.
+            old_signature (tuple): Signature of the table files before the write.
+
+    Returns:
+            None.
+    """
+    reservation = id_reservations.get(table_name)
+    if reservation and reservation[2] == old_signature:
+        reservation[2] = get_table_signature(table_name)
+
+
+def read_table_log(table_name):
+    """
+    Read the entries appended to the table log since the last compaction.
+
+    Args:
+            table_name (str): Name of the table.
+
+    Returns:
+            list: Log entries in the order they were written.
+    """
+    log_path = get_table_log_path(table_name)
+    if not log_path or not os.path.exists(log_path):
+        return []
+
+    entries = []
+    with open(log_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Недописанная последняя запись после сбоя - пропускаем
+                print(f"Предупреждение: пропущена поврежденная запись в '{log_path}'")
+    return entries
+
+
+def sort_rows_by_id(table_data):
+    """
+    Sort the rows of a table by ID in place.
+    """
+    if isinstance(table_data, ColumnarTable):
+        table_data.sort_by_id()
+    else:
+        table_data.sort(key=lambda row: row["ID"])
+
+
+def apply_table_log(table_data, entries):
+    """
+    Apply log entries on top of the rows loaded from the main table file.
+
+    Inserted rows are appended and update entries are applied in log order,
+    rows listed in delete entries (tombstones) are dropped in a single pass
+    at the end. Rows stay sorted by ID, even if processes writing with
+    their own ID blocks logged them out of order.
+
+    Args:
+            table_data (list): Rows from the main table file.
+            entries (list): Entries returned by read_table_log.
+
+    Returns:
+            tuple: (rows with the log applied, number of deleted rows).
+    """
+    if not entries:
+        return table_data, 0
+
+    last_id = table_data[-1]["ID"] if len(table_data) else 0
+    tail_id = last_id
+    unordered = False
+    known_ids = None
+    deleted_ids = set()
+    for entry in entries:
+        if entry.get("op") == "delete":
+            deleted_ids.update(entry.get("ids", []))
+            continue
+        if entry.get("op") == "update":
+            ids, values = entry.get("ids", []), entry.get("set", {})
+            # Поиск строк по ID работает только на отсортированных строках
+            if unordered:
+                sort_rows_by_id(table_data)
+                unordered = False
+            if isinstance(table_data, ColumnarTable):
+                table_data.set_values(table_data.id_positions(ids), values)
+            else:
+                for row in find_rows_by_ids(table_data, ids):
+                    row.update(values)
+            continue
+        row = entry.get("row")
+        if not isinstance(row, dict):
+            continue
+        # Запись уже попала в основной файл, если сбой случился до очистки лога
+        if row.get("ID") <= last_id:
+            if known_ids is None:
+                known_ids = {row.get("ID") for row in table_data}
+            if row.get("ID") in known_ids:
+                continue
+        if row.get("ID") < tail_id:
+            unordered = True
+        tail_id = max(tail_id, row.get("ID"))
+        table_data.append(row)
+    if unordered:
+        sort_rows_by_id(table_data)
+
+    if not deleted_ids:
+        return table_data, 0
+    row_count = len(table_data)
+    if isinstance(table_data, ColumnarTable):
+        table_data.delete_ids(deleted_ids)
+    else:
+        table_data = [row for row in table_data if row.get("ID") not in deleted_ids]
+    return table_data, row_count - len(table_data)
+
+
+def apply_table_engine(table_name, signature, data, table_metadata):
+    """
+    Convert loaded rows to the in-memory representation chosen for the table.
 
     Args:
             table_name (str): Name of the table.
+            signature (tuple): Signature of the table files.
+            data (list or ColumnarTable): Loaded table data.
+            table_metadata (dict): Metadata of the table.
 
     Returns:
-            dict: Data as dictionary. Returns empty dict on error.
+            list or ColumnarTable: Table data in the chosen representation.
+    """
+    columnar = table_metadata.get("engine") == "columnar"
+    if columnar == isinstance(data, ColumnarTable):
+        return data
+
+    if columnar:
+        data = ColumnarTable(table_metadata["columns"], data)
+    else:
+        data = list(data)
+
+    if is_dirty(table_name):
+        put_dirty(table_name, data)
+    else:
+        put_pooled(table_name, signature, data)
+    return data
+
+
+def load_table_data(table_name, table_metadata=None):
+    """
+    Load data from a JSON file and replay the rows appended to its log.
+
+    Decoded tables are kept in the buffer pool and reused while the table
+    files are unchanged.
+
+    Args:
+            table_name (str): Name of the table.
+            table_metadata (dict, optional): Metadata of the table. If given,
+                    the data is returned in the engine chosen for the table.
+
+    Returns:
+            list or ColumnarTable: Rows of the table. Empty list on error.
     """
     file_path = get_table_data_path(table_name)
     if not file_path:
         return None
 
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, "r") as file:
-                data = json.load(file)
-            return data if isinstance(data, list) else []
-        else:
+    signature = get_table_signature(table_name)
+    track_table_signature(table_name, signature)
+    data = get_pooled(table_name, signature)
+    if data is None:
+        try:
+            if file_path.endswith(TABLE_FORMATS["binary"]):
+                data = read_binary_table(file_path)
+            elif file_path.endswith(TABLE_FORMATS["segmented"]):
+                data = read_segmented_table(file_path)
+            elif os.path.exists(file_path):
+                with open(file_path, "r") as file:
+                    data = json.load(file)
+                data = data if isinstance(data, list) else []
+            else:
+                data = []
+            data, dead_rows[table_name] = apply_table_log(
+                data, read_table_log(table_name)
+            )
+            put_pooled(table_name, signature, data)
+        except FileNotFoundError:
+            print(f"Ошибка, файл {file_path} не найден")
+            return []
+        except json.JSONDecodeError:
+            print(f"Ошибка, некорректный формат в '{file_path}'.")
+            return []
+        except PermissionError:
+            print(f"Нет прав на чтение файла: {file_path}")
+            return []
+        except Exception as e:
+            print(f"Ошибка загрузки данных: {e}")
             return []
-    except FileNotFoundError:
-        print(f"Ошибка, файл {file_path} не найден")
-        return []
-    except json.JSONDecodeError:
-        print(f"Ошибка, некорректный формат в '{file_path}'.")
-        return []
-    except PermissionError:
-        print(f"Нет прав на чтение файла: {file_path}")
-        return []
-    except Exception as e:
-        print(f"Ошибка загрузки данных: {e}")
-        return []
 
+    if table_metadata:
+        data = apply_table_engine(table_name, signature, data, table_metadata)
+    return data
 
-def save_table_data(table_name, data):
+
+def load_table_for_read(table_name, table_metadata=None, where_clause=None,
+                        columns=None):
     """
-    Save data to a JSON file.
+    Get table data that is only going to be read.
+
+    A binary table that is not in memory yet and has nothing pending in its
+    log is memory-mapped instead of loaded, so only the values touched by a
+    query are decoded. Of such a segmented table only the columns the query
+    uses are read, from the segments that can hold the IDs allowed by the
+    where clause.
 
     Args:
             table_name (str): Name of the table.
-            data (dict): Data to save.
+            table_metadata (dict, optional): Metadata of the table.
+            where_clause (list, optional): Conditions of the query.
+            columns (list, optional): Columns the query uses, including ID.
+                    By default the query uses all columns.
 
     Returns:
-            None.
+            list or ColumnarTable: Rows of the table.
     """
     file_path = get_table_data_path(table_name)
+    signature = get_table_signature(table_name)
+    track_table_signature(table_name, signature)
+    log_signature = signature[1]
+    if log_signature is None and get_pooled(table_name, signature) is None:
+        if file_path.endswith(TABLE_FORMATS["binary"]):
+            return map_binary_table(file_path)
+        id_low, id_high = id_bounds(where_clause)
+        if (file_path.endswith(TABLE_FORMATS["segmented"])
+                and ((id_low, id_high) != (None, None) or columns)):
+            return read_segmented_table(file_path, id_low, id_high, columns)
+    return load_table_data(table_name, table_metadata)
+
+
+def save_table_data(table_name, data, index_types=None, table_format=None,
+                    columns=None, segments=None):
+    """
+    Save data to the table file and rebuild the indexes of the table.
+
+    Args:
+            table_name (str): Name of the table.
+            data (list or ColumnarTable): Data to save.
+            index_types (dict, optional): Indexes to build {column: type}.
+                    By default the indexes from the index file are rebuilt.
+            table_format (str, optional): "json", "binary" or "segmented".
+                    By default the format of the existing table files is kept.
+            columns (list, optional): Column definitions, needed to write
+                    a list of rows in the binary format for the first time.
+            segments (set, optional): Numbers of the segments of a segmented
+                    table that changed. By default all segments are written.
+
+    Returns:
+            None.
+    """
+    old_format = get_table_format(table_name)
+    table_format = table_format or old_format
+    file_path = get_table_data_path(table_name, table_format)
     if not file_path:
         return None
+    bump_table_version(table_name)
+    old_signature = get_table_signature(table_name)
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Все, что записано до контрольной точки, должно быть на диске раньше,
+        # чем будет удален журнал
+        sync_log()
+
+        if index_types is None:
+            index_types = {
+                column: index["type"]
+                for column, index in load_table_indexes(table_name).items()
+            }
+
+        if table_format == "binary":
+            if isinstance(data, ColumnarTable):
+                columns = data.columns
+            elif columns is None:
+                columns = read_binary_columns(file_path)
+            write_binary_table(file_path, columns, data)
+        elif table_format == "segmented":
+            if isinstance(data, ColumnarTable):
+                columns = data.columns
+            elif columns is None:
+                columns = read_manifest(file_path)["columns"]
+            write_segmented_table(file_path, columns, data, segments)
+        else:
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                rows = list(data) if isinstance(data, ColumnarTable) else data
+                json.dump(rows, file, indent=4, ensure_ascii=False, sort_keys=True)
+                sync_file(file)
+            os.replace(tmp_path, file_path)
 
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4, ensure_ascii=False, sort_keys=True)
+        old_path = get_table_data_path(table_name, old_format)
+        if old_format != table_format:
+            remove_table_path(old_path)
+
+        indexes = {
+            column: build_index(data, column, index_type)
+            for column, index_type in index_types.items()
+        }
+        if indexes:
+            save_indexes(table_name, indexes)
+
+        # Все строки из лога теперь в основном файле
+        sync_directory(os.path.dirname(file_path))
+        log_path = get_table_log_path(table_name)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+            sync_directory(os.path.dirname(log_path))
+        dead_rows[table_name] = 0
+
+        put_pooled(table_name, get_table_signature(table_name), data)
+        put_pooled(get_indexes_pool_key(table_name),
+                   get_indexes_signature(table_name), indexes)
+        keep_id_reservation(table_name, old_signature)
+        release_table_hold(table_name)
     except PermissionError:
         print(f"Нет прав на запись в файл: {file_path}")
 
 
+def load_table_indexes(table_name):
+    """
+    Load the indexes of a table, including the rows appended to its log.
+
+    Args:
+            table_name (str): Name of the table.
+
+    Returns:
+            dict: Indexes in the form {column: index}.
+    """
+    pool_key = get_indexes_pool_key(table_name)
+    signature = get_indexes_signature(table_name)
+    indexes = get_pooled(pool_key, signature)
+    if indexes is not None:
+        return indexes
+
+    indexes = load_indexes(table_name)
+    entries = read_table_log(table_name) if indexes else []
+    if any(entry.get("op") == "delete"
+           or (entry.get("op") == "update"
+               and set(entry.get("set", {})) & set(indexes))
+           for entry in entries):
+        # По ID удаленной или измененной строки ее нельзя найти в индексе,
+        # строим заново
+        data = load_table_data(table_name)
+        indexes = {
+            column: build_index(data, column, index["type"])
+            for column, index in indexes.items()
+        }
+    else:
+        for entry in entries:
+            row = entry.get("row")
+            if not isinstance(row, dict):
+                continue
+            for column, index in indexes.items():
+                add_to_index(index, row, column)
+
+    put_pooled(pool_key, signature, indexes)
+    return indexes
+
+
+def append_table_tombstone(table_name, deleted_rows):
+    """
+    Record deleted rows in the table log instead of rewriting the table.
+
+    The caller has already removed the rows from the loaded table, so the
+    pooled table is kept and only the pooled indexes are updated.
+
+    Args:
+            table_name (str): Name of the table.
+            deleted_rows (list): The deleted rows.
+
+    Returns:
+            bool: True if the tombstone was written.
+    """
+    log_path = get_table_log_path(table_name)
+    if not log_path:
+        return False
+    bump_table_version(table_name)
+
+    dirty = is_dirty(table_name)
+    old_signature = get_table_signature(table_name)
+    pooled_data = get_pooled(table_name, old_signature)
+    indexes_pool_key = get_indexes_pool_key(table_name)
+    pooled_indexes = get_pooled(indexes_pool_key,
+                                get_indexes_signature(table_name))
+    try:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        ids = [row["ID"] for row in deleted_rows]
+        line = json.dumps({"op": "delete", "ids": ids})
+        append_log_lines(log_path, line + "\n")
+    except PermissionError:
+        print(f"Нет прав на запись в файл: {log_path}")
+        evict_table(table_name)
+        return False
+
+    keep_id_reservation(table_name, old_signature)
+    dead_rows[table_name] = dead_rows.get(table_name, 0) + len(deleted_rows)
+    if pooled_indexes is not None:
+        for column, index in pooled_indexes.items():
+            remove_rows_from_index(index, deleted_rows, column)
+    if not dirty:
+        if pooled_data is not None:
+            put_pooled(table_name, get_table_signature(table_name), pooled_data)
+        if pooled_indexes is not None:
+            put_pooled(indexes_pool_key, get_indexes_signature(table_name),
+                       pooled_indexes)
+    return True
+
+
+def append_table_update(table_name, updated_ids, set_clause):
+    """
+    Record updated rows in the table log instead of rewriting the table.
+
+    The caller has already changed the rows of the loaded table, so the
+    pooled table is kept. Pooled indexes are dropped if an indexed column
+    was changed.
+
+    Args:
+            table_name (str): Name of the table.
+            updated_ids (list): IDs of the updated rows.
+            set_clause (dict): New values {column: value}.
+
+    Returns:
+            bool: True if the update was written.
+    """
+    log_path = get_table_log_path(table_name)
+    if not log_path:
+        return False
+    bump_table_version(table_name)
+
+    dirty = is_dirty(table_name)
+    old_signature = get_table_signature(table_name)
+    pooled_data = get_pooled(table_name, old_signature)
+    indexes_pool_key = get_indexes_pool_key(table_name)
+    pooled_indexes = get_pooled(indexes_pool_key,
+                                get_indexes_signature(table_name))
+    try:
+        line = json.dumps({"op": "update", "ids": list(updated_ids),
+                           "set": set_clause}, ensure_ascii=False)
+        append_log_lines(log_path, line + "\n")
+    except PermissionError:
+        print(f"Нет прав на запись в файл: {log_path}")
+        evict_table(table_name)
+        return False
+
+    keep_id_reservation(table_name, old_signature)
+    if pooled_indexes is not None and set(set_clause) & set(pooled_indexes):
+        evict_pooled(indexes_pool_key)
+        pooled_indexes = None
+    if not dirty:
+        if pooled_data is not None:
+            put_pooled(table_name, get_table_signature(table_name), pooled_data)
+        if pooled_indexes is not None:
+            put_pooled(indexes_pool_key, get_indexes_signature(table_name),
+                       pooled_indexes)
+    return True
+
+
+def table_needs_vacuum(table_name, live_rows):
+    """
+    Check whether dead rows make up too much of the table files.
+
+    Args:
+            table_name (str): Name of the table.
+            live_rows (int): Number of rows left in the table.
+
+    Returns:
+            bool: True if the table should be rewritten without dead rows.
+    """
+    dead = dead_rows.get(table_name, 0)
+    if dead == 0:
+        return False
+    return (dead / (dead + live_rows) > VACUUM_DEAD_RATIO
+            or log_needs_compaction(table_name))
+
+
+def mark_table_dirty(table_name, data):
+    """
+    Keep changed table data in memory instead of saving it right away.
+
+    The indexes are rebuilt in memory so reads see the changes before the
+    table is saved with save_table_data. Until then other processes can't
+    lock the table, see hold_table.
+
+    Args:
+            table_name (str): Name of the table.
+            data (list): Changed table data.
+
+    Returns:
+            None.
+    """
+    bump_table_version(table_name)
+    indexes = {
+        column: build_index(data, column, index["type"])
+        for column, index in load_table_indexes(table_name).items()
+    }
+    hold_table(table_name)
+    put_dirty(table_name, data)
+    put_dirty(get_indexes_pool_key(table_name), indexes)
+
+
+def log_needs_compaction(table_name):
+    """
+    Check whether the table log has grown enough to be merged into the main file.
+
+    The threshold grows with the table, so the cost of compaction stays
+    proportional to the number of appended rows.
+
+    Args:
+            table_name (str): Name of the table.
+
+    Returns:
+            bool: True if the log should be compacted.
+    """
+    log_path = get_table_log_path(table_name)
+    if not os.path.exists(log_path):
+        return False
+
+    file_path = get_table_data_path(table_name)
+    # Сегментированная таблица при сжатии переписывает только сегменты
+    # из лога, поэтому порог от ее размера не зависит
+    main_size = 0
+    segmented = file_path.endswith(TABLE_FORMATS["segmented"])
+    if not segmented and os.path.exists(file_path):
+        main_size = os.path.getsize(file_path)
+    threshold = max(LOG_COMPACTION_MIN_BYTES, main_size * LOG_COMPACTION_RATIO)
+    return os.path.getsize(log_path) > threshold
+
+
+def log_segments(table_name):
+    """
+    Get the numbers of the segments holding the rows from the table log.
+
+    Args:
+            table_name (str): Name of the table.
+
+    Returns:
+            set: Numbers of the segments.
+    """
+    ids = []
+    for entry in read_table_log(table_name):
+        ids.extend(entry.get("ids", []))
+        if isinstance(entry.get("row"), dict):
+            ids.append(entry["row"].get("ID"))
+    return touched_segments(row_id for row_id in ids if isinstance(row_id, int))
+
+
+def compact_table_log(table_name):
+    """
+    Merge the table log into the main table file.
+
+    Of a segmented table only the segments holding the rows from the log
+    are rewritten.
+
+    Args:
+            table_name (str): Name of the table.
+
+    Returns:
+            int: Number of deleted rows dropped from the table files.
+    """
+    segments = None
+    if get_table_format(table_name) == "segmented" and not is_dirty(table_name):
+        # В несохраненной таблице могут быть изменения, которых нет в логе
+        segments = log_segments(table_name)
+    # Мертвые строки считаются при загрузке, когда к таблице применяется лог
+    data = load_table_data(table_name)
+    dead = dead_rows.get(table_name, 0)
+    save_table_data(table_name, data, segments=segments)
+    return dead
+
+
+def append_table_record(table_name, record):
+    """
+    Append a single record to the table log instead of rewriting the table.
+
+    Args:
+            table_name (str): Name of the table.
+            record (dict): The record to append.
+
+    Returns:
+            bool: True if the record was written.
+    """
+    return append_table_records(table_name, [record])
+
+
+def append_table_records(table_name, records):
+    """
+    Append records to the table log with a single write.
+
+    Returns once a group commit has flushed the write to disk.
+
+    Args:
+            table_name (str): Name of the table.
+            records (list): The records to append.
+
+    Returns:
+            bool: True if the records were written.
+    """
+    log_path = get_table_log_path(table_name)
+    if not log_path:
+        return False
+    bump_table_version(table_name)
+
+    # Таблица и индексы в пуле дополняются записями, а не читаются заново
+    old_signature = get_table_signature(table_name)
+    pooled_data = get_pooled(table_name, old_signature)
+    indexes_pool_key = get_indexes_pool_key(table_name)
+    pooled_indexes = get_pooled(indexes_pool_key,
+                                get_indexes_signature(table_name))
+    try:
+        lines = "".join(
+            json.dumps({"op": "insert", "row": record}, ensure_ascii=False) + "\n"
+            for record in records
+        )
+        append_log_lines(log_path, lines, len(records))
+    except PermissionError:
+        print(f"Нет прав на запись в файл: {log_path}")
+        return False
+    keep_id_reservation(table_name, old_signature)
+
+    # Несохраненная таблица остается в пуле как есть, записи попадут в файл
+    # при ее сбросе
+    dirty = is_dirty(table_name)
+    if pooled_data is not None:
+        for record in records:
+            pooled_data.append(record)
+        if not dirty:
+            put_pooled(table_name, get_table_signature(table_name), pooled_data)
+    if pooled_indexes is not None:
+        for column, index in pooled_indexes.items():
+            for record in records:
+                add_to_index(index, record, column)
+        if not dirty:
+            put_pooled(indexes_pool_key, get_indexes_signature(table_name),
+                       pooled_indexes)
+
+    if log_needs_compaction(table_name):
+        compact_table_log(table_name)
+    return True
+
+
+def iter_import_rows(file_path, useful_table_columns):
+    """
+    Read rows to import from a CSV or JSONL file one by one.
+
+    A CSV file must start with a header of column names, a JSONL file holds
+    one object per line. The ID column is ignored, IDs are assigned on
+    import.
+
+    Args:
+            file_path (str): Path of the file, ".csv" or ".jsonl".
+            useful_table_columns (list): Column definitions without ID.
+
+    Yields:
+            tuple: (line number, list of string values in column order).
+    """
+    names = [column.split(":", 1)[0] for column in useful_table_columns]
+
+    with open(file_path, "r", encoding="utf-8", newline="") as file:
+        if file_path.endswith(".csv"):
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return
+            missing = [name for name in names if name not in header]
+            if missing:
+                raise ValueError(f"в файле нет столбцов {', '.join(missing)}")
+            positions = [header.index(name) for name in names]
+            for values in reader:
+                if not values:
+                    continue
+                if len(values) != len(header):
+                    raise ValueError(
+                        f"строка {reader.line_num}: ожидается "
+                        f"{len(header)} значений"
+                    )
+                yield reader.line_num, [values[i] for i in positions]
+            return
+
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"строка {line_number}: ожидается объект")
+            missing = [name for name in names if row.get(name) is None]
+            if missing:
+                raise ValueError(
+                    f"строка {line_number}: нет столбцов {', '.join(missing)}"
+                )
+            yield line_number, [str(row[name]) for name in names]
+
+
 def validate_and_convert_types(useful_table_columns, values):
     """
     Validate and convert values to their respective types.
@@ -170,6 +1102,78 @@ def validate_and_convert_types(useful_table_columns, values):
     return converted_values
 
 
+def allocate_ids(metadata, table_name, count=1):
+    """
+    Reserve a block of consecutive IDs from the table sequence.
+
+    The sequence is stored in the table metadata and saved before the IDs
+    are used, so IDs are never reused, even after a crash or after the
+    rows with the highest IDs are deleted. With a cache size above one the
+    IDs are reserved in blocks and the metadata is saved once per block;
+    release_ids gives back the unused rest of the blocks. The caller holds
+    the exclusive lock of the table.
+
+    Rows are stored in ID order, so a block is dropped once another process
+    has written to the table: its rows may already have higher IDs than the
+    rest of the block.
+
+    Args:
+            metadata (dict): The metadata dictionary.
+            table_name (str): Name of the table.
+            count (int): Number of IDs to reserve.
+
+    Returns:
+            int: The first reserved ID.
+    """
+    reservation = id_reservations.get(table_name)
+    if (reservation and reservation[0] + count <= reservation[1]
+            and reservation[2] == get_table_signature(table_name)):
+        first_id = reservation[0]
+        reservation[0] += count
+        return first_id
+
+    # Последовательность берется из файла, ее могли сдвинуть другие процессы
+    with metadata_transaction(metadata):
+        table_metadata = metadata[table_name]
+        if "next_id" not in table_metadata:
+            # Таблица создана до появления последовательностей
+            table_metadata["next_id"] = id_generator(load_table_data(table_name))
+
+        first_id = table_metadata["next_id"]
+        block_end = first_id + max(count, sequence_state["cache_size"])
+        table_metadata["next_id"] = block_end
+        save_metadata(metadata)
+    id_reservations[table_name] = [first_id + count, block_end,
+                                   get_table_signature(table_name)]
+    return first_id
+
+
+def release_ids(metadata):
+    """
+    Give back the reserved but unused IDs, so the sequences continue right
+    after the last used ID.
+
+    Args:
+            metadata (dict): The metadata dictionary.
+
+    Returns:
+            None.
+    """
+    if not id_reservations:
+        return
+    with metadata_transaction(metadata):
+        changed = False
+        for table_name, (next_id, block_end, _) in id_reservations.items():
+            # Если другой процесс уже взял ID после блока, остаток не вернуть
+            table_metadata = metadata.get(table_name)
+            if table_metadata and table_metadata.get("next_id") == block_end:
+                table_metadata["next_id"] = next_id
+                changed = True
+        id_reservations.clear()
+        if changed:
+            save_metadata(metadata)
+
+
 def id_generator(table_data):
     """
     Generate a unique ID for a new row.
@@ -205,32 +1209,47 @@ def create_record(new_id, checked_values, useful_table_columns):
     return record
 
 
-def display_table_data(table_data, table_name="Данные"):
+def display_table_data(table_data, table_name="Данные",
+                       page_size=DISPLAY_PAGE_SIZE):
     """Display table data in a formatted table using PrettyTable.
 
+    Rows are read and printed in pages of page_size rows, so a large table
+    is never rendered as a whole.
+
     Args:
-        table_data (list): List of dictionaries representing table rows.
+        table_data (iterable): Dictionaries representing table rows.
                           Each dictionary should have the same keys.
         table_name (str): Name of the table for the title.
+        page_size (int): Number of rows printed at once.
 
     Returns:
         None: Prints the formatted table to console.
     """
-    if not table_data:
+    rows = iter(table_data)
+    page = list(islice(rows, page_size))
+    if not page:
         return
 
-    table = PrettyTable()
+    field_names = list(page[0].keys())
+    title = f"{table_name}"
+
+    while page:
+        table = PrettyTable()
 
-    table.field_names = list(table_data[0].keys())
+        table.field_names = field_names
 
-    for row in table_data:
-        table.add_row([row[field] for field in table.field_names])
+        for row in page:
+            table.add_row([row[field] for field in field_names])
 
-    table.align = "l"
-    table.horizontal_char = "─"
-    table.vertical_char = "│"
-    table.junction_char = "┼"
+        table.align = "l"
+        table.horizontal_char = "─"
+        table.vertical_char = "│"
+        table.junction_char = "┼"
 
-    table.title = f"{table_name}"
+        # Заголовок таблицы печатается только над первой страницей
+        if title:
+            table.title = title
+            title = None
 
-    print(table)
+        print(table, flush=True)
+        page = list(islice(rows, page_size))
@@ -0,0 +1,210 @@
+import os
+import threading
+
+from primitive_db.constants import DATA_DIR, WAL_SYNC_INTERVAL_MS, WAL_SYNC_OPS
+
+# Журналы таблиц служат журналом упреждающей записи: строка дописывается
+# сразу, а команда завершается только после fsync, который покрывает ее
+# запись. fsync выполняется группой: первый писатель, не заставший идущей
+# синхронизации, становится ведущим и сбрасывает на диск все записанное к
+# этому моменту, остальные ждут его на условной переменной. Записи, сделанные
+# во время fsync, попадают в следующую группу. Если другие писатели уже ждут,
+# ведущий дает им до WAL_SYNC_INTERVAL_MS миллисекунд, чтобы набралось
+# WAL_SYNC_OPS операций.
+unsynced_paths = set()
+wal_state = {
+    "pending": 0, "written": 0, "synced": 0, "syncing": False, "waiting": 0,
+    "syncs": 0, "deferred": False,
+}
+wal_condition = threading.Condition()
+
+
+def sync_file(file):
+    """
+    Flush an open file to disk.
+    """
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def sync_directory(path):
+    """
+    Flush a directory to disk, so that created, renamed and removed files
+    survive a crash.
+    """
+    if not os.path.isdir(path):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_path(path):
+    """
+    Flush a file to disk by its path.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_pending(sync_ops=None, sync_interval_ms=0):
+    """
+    Flush all files written so far to disk as the leader of a group sync.
+
+    The caller holds wal_condition and no other sync is running. The lock
+    is released during the fsync calls, so other writers can add to the
+    next group meanwhile.
+
+    Args:
+        sync_ops (int, optional): Number of pending operations the leader
+            waits for if other writers are waiting too.
+        sync_interval_ms (int): Longest wait for sync_ops operations.
+
+    Returns:
+        int: Number of synced operations.
+    """
+    wal_state["syncing"] = True
+    try:
+        if sync_ops is not None and wal_state["waiting"] > 1:
+            wal_condition.wait_for(
+                lambda: wal_state["pending"] >= sync_ops,
+                sync_interval_ms / 1000,
+            )
+        paths = sorted(unsynced_paths)
+        pending, target = wal_state["pending"], wal_state["written"]
+        unsynced_paths.clear()
+        wal_state["pending"] = 0
+
+        synced = False
+        wal_condition.release()
+        try:
+            for path in paths:
+                sync_path(path)
+            sync_directory(DATA_DIR)
+            synced = True
+        finally:
+            wal_condition.acquire()
+            if not synced:
+                # Следующий ведущий повторит синхронизацию
+                unsynced_paths.update(paths)
+                wal_state["pending"] += pending
+        wal_state["synced"] = target
+        wal_state["syncs"] += 1
+        return pending
+    finally:
+        wal_state["syncing"] = False
+        wal_condition.notify_all()
+
+
+def sync_log():
+    """
+    Flush all files written since the last sync to disk with one fsync each.
+
+    Returns:
+        int: Number of synced operations.
+    """
+    with wal_condition:
+        wal_condition.wait_for(lambda: not wal_state["syncing"])
+        if not wal_state["pending"] and not unsynced_paths:
+            return 0
+        return sync_pending()
+
+
+def defer_sync(deferred=True):
+    """
+    Make writes wait for an explicit sync_log call instead of group commit.
+
+    Args:
+        deferred (bool): Whether writes wait for an explicit sync_log.
+
+    Returns:
+        None.
+    """
+    with wal_condition:
+        wal_state["deferred"] = deferred
+
+
+def register_write(path, operations=1, sync_ops=WAL_SYNC_OPS,
+                   sync_interval_ms=WAL_SYNC_INTERVAL_MS):
+    """
+    Remember a written file and wait until a group sync puts it on disk.
+
+    Unless syncs are deferred, the write returns only after an fsync that
+    started after it, so a command is never acknowledged before its log
+    record is durable.
+
+    Args:
+        path (str): Path of the written file.
+        operations (int): Number of operations in the write.
+        sync_ops (int): Number of pending operations a leader waits for
+            when other writers are waiting.
+        sync_interval_ms (int): Longest wait of a leader in milliseconds.
+
+    Returns:
+        None.
+    """
+    with wal_condition:
+        unsynced_paths.add(path)
+        wal_state["pending"] += operations
+        wal_state["written"] += 1
+        ticket = wal_state["written"]
+        if wal_state["deferred"]:
+            return
+        # Ведущий может ждать, пока наберется группа
+        wal_condition.notify_all()
+        wal_state["waiting"] += 1
+        try:
+            while wal_state["synced"] < ticket:
+                if wal_state["syncing"]:
+                    wal_condition.wait()
+                else:
+                    sync_pending(sync_ops, sync_interval_ms)
+        finally:
+            wal_state["waiting"] -= 1
+
+
+def append_log_lines(log_path, lines, operations=1):
+    """
+    Append lines to a table log and wait for the group commit covering them.
+
+    Args:
+        log_path (str): Path of the table log.
+        lines (str): Lines to append, each ending with a newline.
+        operations (int): Number of operations in the lines.
+
+    Returns:
+        None.
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as file:
+        file.write(lines)
+    register_write(log_path, operations)
+
+
+def repair_log_tail(log_path):
+    """
+    Cut off the last line of a log if it was only partly written before a crash.
+
+    Args:
+        log_path (str): Path of the table log.
+
+    Returns:
+        bool: True if the log was repaired.
+    """
+    if not os.path.exists(log_path):
+        return False
+    with open(log_path, "rb+") as file:
+        content = file.read()
+        if not content or content.endswith(b"\n"):
+            return False
+        file.truncate(content.rfind(b"\n") + 1)
+        sync_file(file)
+    return True
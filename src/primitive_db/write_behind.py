@@ -0,0 +1,229 @@
+import threading
+
+from primitive_db.buffer_pool import is_dirty, storage_lock
+from primitive_db.constants import WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_PENDING
+from primitive_db.locks import lock_state, table_lock
+from primitive_db.utils import (
+    append_table_tombstone,
+    append_table_update,
+    compact_table_log,
+    get_table_format,
+    load_table_data,
+    log_needs_compaction,
+    log_segments,
+    mark_table_dirty,
+    save_table_data,
+    table_needs_vacuum,
+)
+
+# Несохраненные таблицы: {таблица: сегменты, измененные помимо лога}, None -
+# изменены все сегменты
+dirty_tables = {}
+flusher_state = {"thread": None, "pending": 0, "deferred": False}
+flush_requested = threading.Event()
+stop_requested = threading.Event()
+
+
+def save_changed_table(table_name, data, segments=None):
+    """
+    Save changed table data.
+
+    Of a segmented table only the given segments and the segments holding
+    the rows from the table log are rewritten.
+
+    Args:
+        table_name (str): Name of the table.
+        data (list): Changed table data.
+        segments (set, optional): Segments changed by writes that are not
+            in the log. By default all segments are written.
+
+    Returns:
+        None.
+    """
+    if segments is not None and get_table_format(table_name) == "segmented":
+        segments = segments | log_segments(table_name)
+    else:
+        segments = None
+    save_table_data(table_name, data, segments=segments)
+
+
+def flush_dirty_tables():
+    """
+    Save all tables changed since the last flush.
+
+    Every table is saved under its own lock, after that other processes
+    can use it again.
+
+    Returns:
+        int: Number of saved tables.
+    """
+    with storage_lock:
+        tables = sorted(dirty_tables.items())
+        dirty_tables.clear()
+        flusher_state["pending"] = 0
+        flush_requested.clear()
+
+    flushed = 0
+    for table_name, segments in tables:
+        with table_lock(table_name, exclusive=True):
+            # Таблицу могли удалить до сброса
+            if is_dirty(table_name):
+                save_changed_table(table_name, load_table_data(table_name),
+                                   segments)
+                flushed += 1
+    return flushed
+
+
+# Процесс, которому приходится ждать чужую блокировку, сначала сохраняет свои
+# таблицы, иначе два процесса могли бы ждать друг друга
+lock_state["before_wait"] = flush_dirty_tables
+
+
+def flusher_loop(interval):
+    """
+    Flush dirty tables every interval seconds or when too many writes pile up.
+    """
+    while not stop_requested.is_set():
+        flush_requested.wait(interval)
+        if dirty_tables:
+            flush_dirty_tables()
+
+
+def flushing_deferred():
+    """
+    Check whether changed tables are left in memory instead of being saved.
+    """
+    return flusher_state["thread"] is not None or flusher_state["deferred"]
+
+
+def defer_flushes():
+    """
+    Keep changed tables in memory until stop_flusher, without a background
+    thread. Used to run scripts that should save every table only once.
+
+    Returns:
+        None.
+    """
+    flusher_state["deferred"] = True
+
+
+def start_flusher(interval=WRITE_BEHIND_INTERVAL):
+    """
+    Start the background thread that saves dirty tables.
+
+    Args:
+        interval (float): Seconds between flushes.
+
+    Returns:
+        None.
+    """
+    if flusher_state["thread"] is not None:
+        return
+    stop_requested.clear()
+    thread = threading.Thread(
+        target=flusher_loop, args=(interval,), name="write-behind", daemon=True
+    )
+    flusher_state["thread"] = thread
+    thread.start()
+
+
+def stop_flusher():
+    """
+    Stop the background thread or deferred mode and save everything that is
+    still dirty.
+
+    Returns:
+        None.
+    """
+    thread = flusher_state["thread"]
+    if thread is not None:
+        stop_requested.set()
+        flush_requested.set()
+        thread.join()
+        flusher_state["thread"] = None
+    if dirty_tables:
+        flush_dirty_tables()
+    flusher_state["deferred"] = False
+
+
+def commit_table_data(table_name, data, segments=None,
+                      max_pending=WRITE_BEHIND_MAX_PENDING):
+    """
+    Save changed table data now or, if the flusher is running or flushes are
+    deferred, leave it to the flusher. The caller holds the exclusive lock of
+    the table.
+
+    Args:
+        table_name (str): Name of the table.
+        data (list): Changed table data.
+        segments (set, optional): Segments changed by writes that are not
+            in the log, see save_changed_table.
+        max_pending (int): Number of deferred writes that triggers a flush.
+
+    Returns:
+        None.
+    """
+    if not flushing_deferred():
+        save_changed_table(table_name, data, segments)
+        return
+
+    with storage_lock:
+        mark_table_dirty(table_name, data)
+        if table_name in dirty_tables:
+            changed = dirty_tables[table_name]
+            segments = (None if changed is None or segments is None
+                        else changed | segments)
+        dirty_tables[table_name] = segments
+        flusher_state["pending"] += 1
+        if flusher_state["pending"] >= max_pending:
+            flush_requested.set()
+
+
+def commit_table_delete(table_name, table_data, deleted_rows):
+    """
+    Record deleted rows and compact the table once it has too many of them.
+
+    Compaction is left to the flusher if it is running.
+
+    Args:
+        table_name (str): Name of the table.
+        table_data (list): Table data without the deleted rows.
+        deleted_rows (list): The deleted rows.
+
+    Returns:
+        None.
+    """
+    if not append_table_tombstone(table_name, deleted_rows):
+        return
+    if not table_needs_vacuum(table_name, len(table_data)):
+        return
+    if not flushing_deferred():
+        compact_table_log(table_name)
+    else:
+        # Все изменения уже в логе
+        commit_table_data(table_name, table_data, set())
+
+
+def commit_table_update(table_name, table_data, updated_ids, set_clause):
+    """
+    Record updated rows and compact the table once its log grows too large.
+
+    Compaction is left to the flusher if it is running.
+
+    Args:
+        table_name (str): Name of the table.
+        table_data (list): Table data with the rows already updated.
+        updated_ids (list): IDs of the updated rows.
+        set_clause (dict): New values {column: value}.
+
+    Returns:
+        None.
+    """
+    if not append_table_update(table_name, updated_ids, set_clause):
+        return
+    if not log_needs_compaction(table_name):
+        return
+    if not flushing_deferred():
+        compact_table_log(table_name)
+    else:
+        commit_table_data(table_name, table_data, set())
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+
+class Database:
+    """
+    A database in a temporary directory, run in a separate process for every
+    call, so the caches and buffer pools of one call don't leak into another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def run(self, code):
+        """
+        Run Python code in the database directory and return its output.
+        """
+        env = dict(os.environ, PYTHONPATH=SRC_DIR)
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=self.path, env=env,
+            capture_output=True, text=True, check=True, timeout=120,
+        )
+        return result.stdout
+
+    def script(self, lines):
+        """
+        Run commands like the -f option does.
+        """
+        return self.run(
+            "from primitive_db.engine import run_script\n"
+            f"run_script({list(lines)!r})"
+        )
+
+    def evaluate(self, code, expression):
+        """
+        Run code and return the value of an expression converted to JSON.
+        """
+        output = self.run(f"import json\n{code}\n"
+                          f"print(json.dumps({expression}, default=list))")
+        return json.loads(output.splitlines()[-1])
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(tmp_path)
@@ -0,0 +1,40 @@
+import pytest
+
+READ_IDS = "from primitive_db.utils import load_metadata, load_table_data"
+IDS = "[row['ID'] for row in load_table_data('t')]"
+
+
+@pytest.mark.parametrize("write, rows_left", [
+    ("update t set a = 100 where ID = 1", 5),
+    ("delete from t where a = {value}", 0),
+])
+def test_ids_stay_contiguous_when_writes_alternate(db, write, rows_left):
+    lines = ["create_table t a:int"]
+    for value in range(5):
+        lines += [f"insert into t values ({value})", write.format(value=value)]
+    db.script(lines)
+
+    assert db.evaluate(READ_IDS, IDS) == list(range(1, rows_left + 1))
+    assert db.evaluate(READ_IDS, "load_metadata()['t']['next_id']") == 6
+
+
+def test_ids_stay_in_order_when_another_process_writes(db):
+    db.script(["create_table t a:int", "insert into t values (1)"])
+    # Первый процесс держит блок ID, пока второй вставляет строки
+    db.run(
+        "from primitive_db.engine import run_script\n"
+        "import subprocess, sys\n"
+        "def lines():\n"
+        "    yield 'insert into t values (2)'\n"
+        "    subprocess.run([sys.executable, '-c', 'from primitive_db.engine "
+        "import run_script; run_script([\"insert into t values (3)\"])'],"
+        " check=True)\n"
+        "    yield 'insert into t values (4)'\n"
+        "run_script(lines())"
+    )
+
+    ids = db.evaluate(READ_IDS, IDS)
+    assert len(ids) == 4
+    assert ids == sorted(ids)
+    assert db.evaluate(READ_IDS, "[row['a'] for row in load_table_data('t')]") \
+        == [1, 2, 3, 4]
@@ -0,0 +1,28 @@
+import pytest
+
+SELECT = (
+    "from primitive_db.core import select\n"
+    "from primitive_db.utils import load_table_data, load_table_indexes\n"
+    "results = [\n"
+    "    list(select(load_table_data('t'), None, load_table_indexes('t'), 't',\n"
+    "                limit, offset, order_by=('age', descending)))\n"
+    "    for descending in (False, True)\n"
+    "    for limit, offset in ((None, 0), (5, 0), (5, 3))\n"
+    "]"
+)
+
+
+@pytest.mark.parametrize("engine", ["rows", "columnar"])
+def test_ordered_index_returns_rows_of_sort(db, engine):
+    lines = ["create_table t name:str age:int", f"set_engine t {engine}"]
+    # У многих строк одинаковый возраст, порядок между ними должен совпадать
+    lines += [f"insert into t values (n{number}, {number * 7 % 4})"
+              for number in range(30)]
+    db.script(lines)
+    sorted_results = db.evaluate(SELECT, "results")
+
+    db.script(["create_index t age ordered"])
+    indexed_results = db.evaluate(SELECT, "results")
+
+    assert indexed_results == sorted_results
+    assert [row["ID"] for row in sorted_results[4]] == [2, 6, 10, 14, 18]